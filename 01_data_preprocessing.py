@@ -1,72 +1,99 @@
-# scripts/01_data_preprocessing.py
-import sys
-import os
-# Ensure project root is on sys.path for imports
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
-if PROJECT_ROOT not in sys.path:
-    sys.path.insert(0, PROJECT_ROOT)
-
-import rasterio
-import numpy as np
-import pandas as pd
-from config import *
-
-def prepare_training_data():
-    """Load and prepare training data"""
-    print("📊 Step 1: Preparing training data...")
-    
-    # Check if input file exists
-    if not os.path.exists(NDVI_2024_PATH):
-        print(f"❌ NDVI file not found: {NDVI_2024_PATH}")
-        print("💡 Please add your NDVI TIFF file to the data/raw/ directory")
-        return None, None
-    
-    try:
-        # Load NDVI data
-        with rasterio.open(NDVI_2024_PATH) as src:
-            ndvi_data = src.read()
-            profile = src.profile
-            
-            # For demo purposes, create synthetic clusters
-            # In real scenario, you'd have actual cluster data
-            height, width = ndvi_data.shape[1], ndvi_data.shape[2]
-            clusters = np.random.choice([1, 2, 3, 4], size=(height, width))
-        
-        print(f"📐 Data dimensions: {ndvi_data.shape}")
-        
-        # Reshape and create DataFrame
-        ndvi_flat = ndvi_data.reshape(ndvi_data.shape[0], -1).T
-        df = pd.DataFrame(ndvi_flat, 
-                         columns=[f"NDVI_Band_{i+1}" for i in range(ndvi_data.shape[0])])
-        
-        # Add cluster labels
-        df['Cluster'] = clusters.flatten()
-        
-        # Remove background pixels (cluster = 0)
-        df = df[df['Cluster'] > 0]
-        
-        # Add feature engineering
-        df['NDVI_Mean'] = df[['NDVI_Band_1', 'NDVI_Band_2', 'NDVI_Band_3']].mean(axis=1)
-        df['NDVI_Std'] = df[['NDVI_Band_1', 'NDVI_Band_2', 'NDVI_Band_3']].std(axis=1)
-        df['NDVI_Range'] = df[['NDVI_Band_1', 'NDVI_Band_2', 'NDVI_Band_3']].max(axis=1) - \
-                          df[['NDVI_Band_1', 'NDVI_Band_2', 'NDVI_Band_3']].min(axis=1)
-        
-        # Remove any remaining NaN values
-        df = df.dropna()
-        
-        print(f"✅ Training data prepared: {df.shape[0]} samples, {df.shape[1]} features")
-        return df, profile
-        
-    except Exception as e:
-        print(f"❌ Error processing data: {e}")
-        return None, None
-
-if __name__ == "__main__":
-    df, profile = prepare_training_data()
-    if df is not None:
-        os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
-        df.to_csv(os.path.join(PROCESSED_DATA_DIR, 'training_data.csv'), index=False)
-        print("💾 Training data saved to: data/processed/training_data.csv")
-    else:
+# scripts/01_data_preprocessing.py
+import sys
+import os
+# Ensure project root is on sys.path for imports
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import rasterio
+import numpy as np
+import pandas as pd
+import argparse
+from config import *
+from ndvi_features import build_features, feature_columns
+from profiling import timer
+from raster_io import band_decoding, iter_windows, valid_mask
+from sampling import StratifiedReservoir
+from training_store import write_training_store
+
+def prepare_training_data(samples_per_class=SAMPLES_PER_CLASS, seed=SAMPLE_SEED,
+                          window_size=SAMPLING_WINDOW_SIZE):
+    """Load and prepare training data
+    
+    The NDVI raster is streamed window by window into a per-class reservoir
+    (stratified on Cluster), so memory stays bounded by
+    ``samples_per_class`` instead of growing with the raster. The same
+    ``seed`` always yields the same training set.
+    """
+    print("📊 Step 1: Preparing training data...")
+    
+    # Check if input file exists
+    if not os.path.exists(NDVI_2024_PATH):
+        print(f"❌ NDVI file not found: {NDVI_2024_PATH}")
+        print("💡 Please add your NDVI TIFF file to the data/raw/ directory")
+        return None, None
+    
+    try:
+        rng = np.random.default_rng(seed)
+        reservoir = StratifiedReservoir(samples_per_class, seed=seed)
+        
+        # Load NDVI data
+        with rasterio.open(NDVI_2024_PATH) as src:
+            profile = src.profile
+            n_bands = src.count
+            scale, offset = band_decoding(src)
+            print(f"📐 Data dimensions: ({n_bands}, {src.height}, {src.width})")
+            
+            for window in iter_windows(src, window_size):
+                with timer('raster_read', pixels=window.width * window.height):
+                    ndvi_block = src.read(window=window)
+                
+                # For demo purposes, create synthetic clusters
+                # In real scenario, you'd have actual cluster data
+                clusters = rng.choice([1, 2, 3, 4], size=ndvi_block.shape[1:]).ravel()
+                
+                # Build features on the flattened (bands, pixels) block
+                with timer('feature_build', pixels=window.width * window.height):
+                    features = build_features(ndvi_block.reshape(n_bands, -1), scale, offset)
+                
+                # Remove background pixels (cluster = 0), nodata and NaN values
+                keep = (clusters > 0) & valid_mask(ndvi_block, src.nodata).ravel()
+                keep &= np.isfinite(features).all(axis=0)
+                reservoir.add(features[:, keep], clusters[keep])
+        
+        sampled_features, sampled_clusters = reservoir.samples()
+        df = pd.DataFrame(sampled_features.T, columns=feature_columns(n_bands))
+        
+        # Add cluster labels
+        df['Cluster'] = sampled_clusters
+        
+        seen = sum(reservoir.seen.values())
+        print(f"🎲 Sampled {df.shape[0]:,} of {seen:,} labelled pixels (seed={seed})")
+        print(f"✅ Training data prepared: {df.shape[0]} samples, {df.shape[1]} features")
+        return df, profile
+        
+    except Exception as e:
+        print(f"❌ Error processing data: {e}")
+        return None, None
+
+def save_training_data(df, export_csv=EXPORT_TRAINING_CSV):
+    """Write the training data store (and optionally the CSV export)"""
+    write_training_store(df, TRAINING_STORE_DIR)
+    print(f"💾 Training data saved to: {TRAINING_STORE_DIR}")
+    if export_csv:
+        df.to_csv(TRAINING_CSV_PATH, index=False)
+        print(f"💾 CSV export saved to: {TRAINING_CSV_PATH}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prepare crop classification training data")
+    parser.add_argument('--csv', action='store_true', default=EXPORT_TRAINING_CSV,
+                        help="Also export the training data as CSV")
+    args = parser.parse_args()
+    
+    df, profile = prepare_training_data()
+    if df is not None:
+        save_training_data(df, export_csv=args.csv)
+    else:
         print("❌ Data preprocessing failed!")
\ No newline at end of file
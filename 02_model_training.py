@@ -1,97 +1,104 @@
-# scripts/02_model_training.py
-import sys
-import os
-# Ensure project root is on sys.path for imports
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
-if PROJECT_ROOT not in sys.path:
-    sys.path.insert(0, PROJECT_ROOT)
-
-import pandas as pd
-import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split, cross_val_score
-import joblib
-from config import *
-
-def train_crop_classifier():
-    """Train the crop classification model"""
-    print("🤖 Step 2: Training crop classification model...")
-    
-    training_data_path = os.path.join(PROCESSED_DATA_DIR, 'training_data.csv')
-    
-    if not os.path.exists(training_data_path):
-        print(f"❌ Training data not found: {training_data_path}")
-        print("💡 Run 01_data_preprocessing.py first!")
-        return None, None
-    
-    try:
-        # Load prepared data
-        df = pd.read_csv(training_data_path)
-        print(f"📊 Loaded {df.shape[0]} training samples")
-        
-        # Prepare features and target
-        feature_columns = ['NDVI_Band_1', 'NDVI_Band_2', 'NDVI_Band_3', 
-                          'NDVI_Mean', 'NDVI_Std', 'NDVI_Range']
-        
-        X = df[feature_columns]
-        y = df['Cluster']
-        
-        print(f"🎯 Classes distribution: {y.value_counts().to_dict()}")
-        
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y
-        )
-        
-        # Train Random Forest model
-        model = RandomForestClassifier(
-            n_estimators=N_ESTIMATORS,
-            random_state=RANDOM_STATE,
-            max_depth=10,
-            min_samples_split=5,
-            n_jobs=-1
-        )
-        
-        # Cross-validation
-        print("📊 Performing cross-validation...")
-        cv_scores = cross_val_score(model, X_train, y_train, cv=5)
-        print(f"   Cross-validation scores: {cv_scores}")
-        print(f"   Mean CV accuracy: {cv_scores.mean():.3f} (+/- {cv_scores.std() * 2:.3f})")
-        
-        # Train final model
-        print("🏋️ Training final model...")
-        model.fit(X_train, y_train)
-        
-        # Performance
-        train_score = model.score(X_train, y_train)
-        test_score = model.score(X_test, y_test)
-        
-        print(f"🎯 Training accuracy: {train_score:.3f}")
-        print(f"🎯 Test accuracy: {test_score:.3f}")
-        
-        # Feature importance
-        feature_importance = pd.DataFrame({
-            'feature': feature_columns,
-            'importance': model.feature_importances_
-        }).sort_values('importance', ascending=False)
-        
-        print("\n🔍 Feature Importance:")
-        for _, row in feature_importance.iterrows():
-            print(f"   {row['feature']}: {row['importance']:.3f}")
-        
-        return model, feature_columns
-        
-    except Exception as e:
-        print(f"❌ Error training model: {e}")
-        return None, None
-
-if __name__ == "__main__":
-    model, features = train_crop_classifier()
-    if model is not None:
-        os.makedirs(os.path.join(BASE_DIR, 'models'), exist_ok=True)
-        model_path = os.path.join(BASE_DIR, 'models', 'crop_classifier.pkl')
-        joblib.dump(model, model_path)
-        print(f"💾 Model saved to: {model_path}")
-    else:
+# scripts/02_model_training.py
+import sys
+import os
+# Ensure project root is on sys.path for imports
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pandas as pd
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split, cross_val_score
+from config import *
+from ndvi_features import count_bands, feature_columns as ndvi_feature_columns
+from model_registry import save_model
+from training_store import load_training_store, read_manifest, store_exists
+
+def train_crop_classifier(df=None):
+    """Train the crop classification model
+    
+    ``df`` is the training data handed over in memory by the pipeline; when
+    omitted it is loaded from the training data store.
+    """
+    print("🤖 Step 2: Training crop classification model...")
+    
+    if df is None and not store_exists(TRAINING_STORE_DIR) and not os.path.exists(TRAINING_CSV_PATH):
+        print(f"❌ Training data not found: {TRAINING_STORE_DIR}")
+        print("💡 Run 01_data_preprocessing.py first!")
+        return None, None
+    
+    try:
+        # Load prepared data, opening only the columns the model needs
+        if df is not None:
+            feature_columns = ndvi_feature_columns(count_bands(df.columns))
+        elif store_exists(TRAINING_STORE_DIR):
+            stored_columns = [c['name'] for c in read_manifest(TRAINING_STORE_DIR)['columns']]
+            feature_columns = ndvi_feature_columns(count_bands(stored_columns))
+            df = load_training_store(TRAINING_STORE_DIR, columns=feature_columns + ['Cluster'])
+        else:
+            df = pd.read_csv(TRAINING_CSV_PATH)
+            feature_columns = ndvi_feature_columns(count_bands(df.columns))
+        print(f"📊 Loaded {df.shape[0]} training samples")
+        
+        # Prepare features and target
+        X = df[feature_columns]
+        y = df['Cluster']
+        
+        print(f"🎯 Classes distribution: {y.value_counts().to_dict()}")
+        
+        # Split data
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y
+        )
+        
+        # Train Random Forest model
+        model = RandomForestClassifier(
+            n_estimators=N_ESTIMATORS,
+            random_state=RANDOM_STATE,
+            max_depth=10,
+            min_samples_split=5,
+            n_jobs=-1
+        )
+        
+        # Cross-validation
+        print("📊 Performing cross-validation...")
+        cv_scores = cross_val_score(model, X_train, y_train, cv=5)
+        print(f"   Cross-validation scores: {cv_scores}")
+        print(f"   Mean CV accuracy: {cv_scores.mean():.3f} (+/- {cv_scores.std() * 2:.3f})")
+        
+        # Train final model
+        print("🏋️ Training final model...")
+        model.fit(X_train, y_train)
+        
+        # Performance
+        train_score = model.score(X_train, y_train)
+        test_score = model.score(X_test, y_test)
+        
+        print(f"🎯 Training accuracy: {train_score:.3f}")
+        print(f"🎯 Test accuracy: {test_score:.3f}")
+        
+        # Feature importance
+        feature_importance = pd.DataFrame({
+            'feature': feature_columns,
+            'importance': model.feature_importances_
+        }).sort_values('importance', ascending=False)
+        
+        print("\n🔍 Feature Importance:")
+        for _, row in feature_importance.iterrows():
+            print(f"   {row['feature']}: {row['importance']:.3f}")
+        
+        return model, feature_columns
+        
+    except Exception as e:
+        print(f"❌ Error training model: {e}")
+        return None, None
+
+if __name__ == "__main__":
+    model, features = train_crop_classifier()
+    if model is not None:
+        save_model(model, features)
+        print(f"💾 Model saved to: {MODEL_PATH}")
+    else:
         print("❌ Model training failed!")
\ No newline at end of file
@@ -1,82 +1,247 @@
-# scripts/03_prediction_mapping.py
-import sys
-import os
-# Ensure project root is on sys.path for imports
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
-if PROJECT_ROOT not in sys.path:
-    sys.path.insert(0, PROJECT_ROOT)
-import rasterio
-import numpy as np
-import pandas as pd
-import joblib
-from config import *
-
-def create_prediction_map():
-    """Create crop prediction map for entire area"""
-    
-    print("🗺️ Creating prediction map...")
-    
-    # Load model
-    model_path = os.path.join(BASE_DIR, 'models', 'crop_classifier.pkl')
-    model = joblib.load(model_path)
-    
-    # Load NDVI data for prediction
-    with rasterio.open(NDVI_2024_PATH) as src:
-        ndvi_data = src.read()
-        profile = src.profile
-        transform = src.transform
-        bounds = src.bounds
-    
-    # Reshape for prediction
-    original_shape = ndvi_data[0].shape
-    ndvi_flat = ndvi_data.reshape(ndvi_data.shape[0], -1).T
-    
-    # Create DataFrame with features
-    df_pred = pd.DataFrame(ndvi_flat, 
-                          columns=[f"NDVI_Band_{i+1}" for i in range(ndvi_data.shape[0])])
-    
-    # Add engineered features
-    df_pred['NDVI_Mean'] = df_pred[['NDVI_Band_1', 'NDVI_Band_2', 'NDVI_Band_3']].mean(axis=1)
-    df_pred['NDVI_Std'] = df_pred[['NDVI_Band_1', 'NDVI_Band_2', 'NDVI_Band_3']].std(axis=1)
-    df_pred['NDVI_Range'] = df_pred[['NDVI_Band_1', 'NDVI_Band_2', 'NDVI_Band_3']].max(axis=1) - \
-                           df_pred[['NDVI_Band_1', 'NDVI_Band_2', 'NDVI_Band_3']].min(axis=1)
-    
-    # Handle NaN values
-    df_pred = df_pred.fillna(0)
-    
-    # Make predictions
-    print("🤖 Making predictions...")
-    predictions = model.predict(df_pred)
-    
-    # Reshape back to original dimensions
-    prediction_map = predictions.reshape(original_shape)
-    
-    # Update profile for output
-    profile.update({
-        'dtype': rasterio.uint8,
-        'count': 1,
-        'compress': 'lzw'
-    })
-    
-    # Save prediction map
-    output_path = os.path.join(OUTPUT_DIR, 'predictions', 'tumkur_2025_prediction.tif')
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    with rasterio.open(output_path, 'w', **profile) as dst:
-        dst.write(prediction_map.astype(rasterio.uint8), 1)
-    
-    print(f"💾 Prediction map saved: {output_path}")
-    
-    # Print class distribution
-    unique, counts = np.unique(prediction_map, return_counts=True)
-    print("\n📊 Prediction Distribution:")
-    for cls, count in zip(unique, counts):
-        if cls > 0:  # Skip background
-            area_ha = (count * abs(transform[0] * transform[4])) / 10000
-            print(f"  {CROP_NAMES.get(cls, f'Class {cls}')}: {count:,} pixels ({area_ha:,.1f} ha)")
-    
-    return output_path
-
-if __name__ == "__main__":
-    prediction_path = create_prediction_map()
\ No newline at end of file
+# scripts/03_prediction_mapping.py
+import sys
+import os
+# Ensure project root is on sys.path for imports
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+import rasterio
+import numpy as np
+import pandas as pd
+import argparse
+from multiprocessing import Pool, get_start_method
+from rasterio import features as rio_features
+from config import *
+from model_registry import check_raster, load_metadata, load_model
+from ndvi_features import build_features, feature_columns
+from prediction_cache import format_stats, merge_stats, shared_cache
+from profiling import timer
+from raster_io import band_decoding, iter_windows, pool_size, streaming_profile, valid_mask, write_cog
+
+def _predict_pixels(model, pixels, scale=1.0, offset=0.0):
+    """Classify a (bands, pixels) array of valid NDVI pixels"""
+    
+    n_bands, n_pixels = pixels.shape
+    with timer('feature_build', pixels=n_pixels):
+        features = build_features(pixels, scale, offset)
+    
+    with timer('model_predict', pixels=n_pixels):
+        # Wrap without copying so the model sees its training column names
+        df_pred = pd.DataFrame(features.T, columns=feature_columns(n_bands), copy=False)
+        return model.predict(df_pred)
+
+def predict_block(model, ndvi_block, nodata=None, aoi_mask=None, scale=1.0, offset=0.0, cache=None):
+    """Classify a (bands, rows, cols) NDVI block and return a uint8 class block
+    
+    Only valid pixels are classified: pixels that are NaN or ``nodata`` in
+    any band, or outside ``aoi_mask``, are left out of the feature matrix
+    and set to NODATA_CLASS in the result. Compact int16 blocks are passed
+    as stored with the raster's band ``scale``/``offset``. With a
+    PredictionCache, only distinct quantized band vectors it does not
+    already hold reach the model.
+    """
+    
+    n_bands = ndvi_block.shape[0]
+    block_shape = ndvi_block[0].shape
+    
+    valid = valid_mask(ndvi_block, nodata)
+    if aoi_mask is not None:
+        valid &= aoi_mask
+    valid = valid.ravel()
+    n_valid = int(np.count_nonzero(valid))
+    
+    classes = np.full(valid.size, NODATA_CLASS, dtype=rasterio.uint8)
+    if n_valid == 0:
+        return classes.reshape(block_shape)
+    
+    pixels = ndvi_block.reshape(n_bands, -1)
+    if n_valid < valid.size:
+        # Compact the valid pixels so the model never sees nodata
+        pixels = pixels[:, valid]
+    
+    if cache is None:
+        predictions = _predict_pixels(model, pixels, scale, offset)
+    else:
+        predictions = cache.predict(
+            pixels, lambda levels, step: _predict_pixels(model, levels, step), scale, offset
+        )
+    
+    # Scatter the predictions back into the block
+    classes[valid] = predictions
+    return classes.reshape(block_shape)
+
+def load_aoi(aoi_path, crs=None):
+    """Read AOI polygons as a list of geometries in ``crs`` (None if no path)"""
+    if not aoi_path:
+        return None
+    import geopandas as gpd
+    aoi = gpd.read_file(aoi_path)
+    if crs is not None and aoi.crs is not None and aoi.crs != crs:
+        aoi = aoi.to_crs(crs)
+    return [geom for geom in aoi.geometry if geom is not None and not geom.is_empty]
+
+def _aoi_window_mask(aoi_geometries, src, window):
+    """Boolean mask of the window's pixels inside the AOI (None without an AOI)"""
+    if aoi_geometries is None:
+        return None
+    return rio_features.geometry_mask(
+        aoi_geometries,
+        out_shape=(int(window.height), int(window.width)),
+        transform=src.window_transform(window),
+        invert=True
+    )
+
+def _classify_window(model, src, window, aoi_geometries, cache=None):
+    """Read and classify one window, skipping the read if it is outside the AOI"""
+    aoi_mask = _aoi_window_mask(aoi_geometries, src, window)
+    if aoi_mask is not None and not aoi_mask.any():
+        return np.full((int(window.height), int(window.width)), NODATA_CLASS, dtype=rasterio.uint8)
+    with timer('raster_read', pixels=window.width * window.height):
+        ndvi_block = src.read(window=window)
+    return predict_block(model, ndvi_block, src.nodata, aoi_mask, *band_decoding(src), cache=cache)
+
+# Per-process state for tiled prediction workers
+_worker_model = None
+_worker_src = None
+_worker_aoi = None
+_worker_cache = None
+
+def _prediction_cache(cache_precision, model_hash):
+    """This process's prediction cache bound to the model, or None without a precision"""
+    if not cache_precision:
+        return None
+    cache = shared_cache(cache_precision, PREDICTION_CACHE_SIZE)
+    cache.bind(model_hash)
+    return cache
+
+def _init_worker(ndvi_path, aoi_geometries=None, cache_precision=None, model_hash=None):
+    """Load the model and open the NDVI raster once per worker process"""
+    global _worker_model, _worker_src, _worker_aoi, _worker_cache
+    _worker_model = load_model()
+    # Parallelism comes from the pool, not from the forest
+    if hasattr(_worker_model, 'n_jobs'):
+        _worker_model.n_jobs = 1
+    _worker_src = rasterio.open(ndvi_path)
+    _worker_aoi = aoi_geometries
+    _worker_cache = _prediction_cache(cache_precision, model_hash)
+
+def _predict_tile(window):
+    """Read and classify one tile inside a worker process"""
+    prediction = _classify_window(_worker_model, _worker_src, window, _worker_aoi, _worker_cache)
+    return window, prediction, _worker_cache.take_stats() if _worker_cache is not None else None
+
+def _predict_tiles(src, window_size, workers, model=None, aoi_geometries=None,
+                   cache_precision=None, model_hash=None):
+    """Yield (window, prediction, cache stats) in raster order"""
+    
+    windows = iter_windows(src, window_size)
+    
+    if workers == 1:
+        model = model if model is not None else load_model()
+        cache = _prediction_cache(cache_precision, model_hash)
+        for window in windows:
+            prediction = _classify_window(model, src, window, aoi_geometries, cache)
+            yield window, prediction, cache.take_stats() if cache is not None else None
+        return
+    
+    if get_start_method() == 'fork':
+        # Forked workers find the model in load_model's process cache, so the
+        # trees stay pages shared copy-on-write instead of one copy per worker
+        load_model()
+    
+    with Pool(workers, initializer=_init_worker,
+              initargs=(src.name, aoi_geometries, cache_precision, model_hash)) as pool:
+        # imap keeps results in submission order, so tiles are reassembled in order
+        yield from pool.imap(_predict_tile, windows)
+
+def create_prediction_map(window_size=PREDICTION_WINDOW_SIZE, workers=PREDICTION_WORKERS,
+                          model=None, aoi_path=PREDICTION_AOI_PATH,
+                          output_format=PREDICTION_FORMAT, ndvi_path=NDVI_2024_PATH,
+                          output_path=PREDICTION_PATH, cache_precision=PREDICTION_CACHE_PRECISION):
+    """Stream ``ndvi_path`` through the model window by window into ``output_path``"""
+    
+    print("🗺️ Creating prediction map...")
+    
+    workers = pool_size(workers)
+    if window_size is None:
+        # A single window cannot be shared between workers
+        workers = 1
+    
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # A COG is written in one pass from a finished raster, so stream to a temporary file first
+    write_path = output_path + '.tmp.tif' if output_format == 'cog' else output_path
+    
+    class_counts = np.zeros(256, dtype=np.int64)
+    cache_stats = {}
+    model_hash = load_metadata()['model_hash'] if cache_precision else None
+    
+    try:
+        with rasterio.open(ndvi_path) as src:
+            transform = src.transform
+            
+            # Reject a raster the model was not trained for before doing any work
+            check_raster(src.count)
+            aoi_geometries = load_aoi(aoi_path, src.crs)
+            
+            # Update profile for output
+            profile = streaming_profile(src.profile, window_size)
+            profile.update({
+                'dtype': rasterio.uint8,
+                'count': 1,
+                'compress': 'lzw',
+                'nodata': NODATA_CLASS
+            })
+            
+            print(f"🤖 Making predictions ({src.width}x{src.height} pixels, {workers} worker(s))...")
+            with rasterio.open(write_path, 'w', **profile) as dst:
+                for window, prediction_block, stats in _predict_tiles(src, window_size, workers, model,
+                                                                      aoi_geometries, cache_precision, model_hash):
+                    with timer('geotiff_write', pixels=prediction_block.size):
+                        dst.write(prediction_block, 1, window=window)
+                    class_counts += np.bincount(prediction_block.ravel(), minlength=256)
+                    merge_stats(cache_stats, stats)
+            
+        if cache_precision:
+            print(f"🧠 Prediction cache (step {cache_precision:g}): {format_stats(cache_stats)}")
+        
+        if output_format == 'cog':
+            with timer('cog_write', pixels=int(class_counts.sum())):
+                write_cog(write_path, output_path, block_size=COG_BLOCK_SIZE, compress=COG_COMPRESS)
+    finally:
+        # Leave no temporary raster behind, whether the conversion succeeded or not
+        if write_path != output_path and os.path.exists(write_path):
+            os.remove(write_path)
+    
+    print(f"💾 Prediction map saved: {output_path}")
+    
+    # Print class distribution
+    print("\n📊 Prediction Distribution:")
+    print(f"  Nodata / masked: {class_counts[NODATA_CLASS]:,} pixels")
+    for cls in np.flatnonzero(class_counts):
+        if cls != NODATA_CLASS:
+            count = class_counts[cls]
+            area_ha = (count * abs(transform[0] * transform[4])) / 10000
+            print(f"  {CROP_NAMES.get(cls, f'Class {cls}')}: {count:,} pixels ({area_ha:,.1f} ha)")
+    
+    return output_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create crop prediction map")
+    parser.add_argument('--workers', type=int, default=PREDICTION_WORKERS,
+                        help="Worker processes that classify tiles, written back in order (0 = all cores)")
+    parser.add_argument('--window-size', type=int, default=PREDICTION_WINDOW_SIZE,
+                        help="Tile size in pixels; bounds peak memory (0 = the whole raster as one window)")
+    parser.add_argument('--format', choices=['cog', 'gtiff'], default=PREDICTION_FORMAT,
+                        help="Output layout; cog streams a tiled GeoTIFF, then converts it to a COG "
+                             "with mode-resampled overviews")
+    parser.add_argument('--aoi', default=PREDICTION_AOI_PATH,
+                        help="AOI polygon file; pixels outside it (or nodata/NaN) are written as NODATA_CLASS")
+    parser.add_argument('--cache-precision', type=float, default=PREDICTION_CACHE_PRECISION,
+                        help="NDVI step of the prediction memo cache, kept across windows and cleared "
+                             "when the model hash changes (omit to classify every pixel)")
+    args = parser.parse_args()
+    
+    prediction_path = create_prediction_map(window_size=args.window_size or None, workers=args.workers,
+                                            aoi_path=args.aoi,
+                                            output_format=args.format, cache_precision=args.cache_precision)
\ No newline at end of file
@@ -1,115 +1,364 @@
-# scripts/04_district_analysis.py
-import sys
-import os
-# Ensure project root is on sys.path for imports
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
-if PROJECT_ROOT not in sys.path:
-    sys.path.insert(0, PROJECT_ROOT)
-import geopandas as gpd
-import rasterio
-from rasterio import features
-import pandas as pd
-import numpy as np
-from config import *
-
-def load_administrative_data():
-    """Load district and taluk boundaries"""
-    
-    print("🗺️ Loading administrative boundaries...")
-    
-    try:
-        districts = gpd.read_file(DISTRICTS_SHP)
-        taluks = gpd.read_file(TALUKS_SHP)
-        print(f"✅ Loaded {len(districts)} districts and {len(taluks)} taluks")
-        return districts, taluks
-    except Exception as e:
-        print(f"❌ Error loading boundaries: {e}")
-        # Create dummy data for demonstration
-        return None, None
-
-def calculate_zonal_statistics(prediction_path, administrative_gdf, name_column, output_name):
-    """Calculate crop areas by administrative boundaries"""
-    
-    print(f"📊 Calculating zonal statistics for {output_name}...")
-    
-    with rasterio.open(prediction_path) as src:
-        raster_data = src.read(1)
-        transform = src.transform
-        crs = src.crs
-        
-        results = []
-        
-        for idx, row in administrative_gdf.iterrows():
-            # Ensure geometries are in same CRS
-            geometry = row.geometry
-            if geometry is not None:
-                # Create mask for current administrative unit
-                mask = features.geometry_mask(
-                    [geometry],
-                    out_shape=raster_data.shape,
-                    transform=transform,
-                    invert=True
-                )
-                
-                masked_data = raster_data[mask]
-                
-                if len(masked_data) > 0:
-                    unique, counts = np.unique(masked_data, return_counts=True)
-                    
-                    # Calculate pixel area in hectares
-                    pixel_area_ha = abs(transform[0] * transform[4]) / 10000
-                    
-                    for cluster_id, count in zip(unique, counts):
-                        if cluster_id > 0:  # Skip background
-                            area_ha = count * pixel_area_ha
-                            
-                            results.append({
-                                'Region_Type': output_name,
-                                'Region_Name': row[name_column],
-                                'Cluster_ID': cluster_id,
-                                'Crop_Type': CROP_NAMES.get(cluster_id, f'Class {cluster_id}'),
-                                'Area_ha': area_ha,
-                                'Pixel_Count': count,
-                                'Percentage': (count / len(masked_data)) * 100
-                            })
-        
-        return pd.DataFrame(results)
-
-def generate_reports(prediction_path):
-    """Generate comprehensive reports"""
-    
-    districts, taluks = load_administrative_data()
-    
-    if districts is not None:
-        # District-wise analysis
-        district_stats = calculate_zonal_statistics(
-            prediction_path, districts, 'DISTRICT', 'District'
-        )
-        
-        # Taluk-wise analysis
-        taluk_stats = calculate_zonal_statistics(
-            prediction_path, taluks, 'TALUK', 'Taluk'
-        )
-        
-        # Save reports
-        district_stats.to_csv(
-            os.path.join(OUTPUT_DIR, 'reports', 'districtwise_crop_area_2025.csv'), 
-            index=False
-        )
-        taluk_stats.to_csv(
-            os.path.join(OUTPUT_DIR, 'reports', 'talukwise_crop_area_2025.csv'), 
-            index=False
-        )
-        
-        print("📈 Summary Statistics:")
-        print(f"📊 Total crop area analyzed: {district_stats['Area_ha'].sum():,.1f} ha")
-        
-        return district_stats, taluk_stats
-    else:
-        print("⚠️ Using demo mode - no shapefiles available")
-        return None, None
-
-if __name__ == "__main__":
-    prediction_path = os.path.join(OUTPUT_DIR, 'predictions', 'tumkur_2025_prediction.tif')
+# scripts/04_district_analysis.py
+import sys
+import os
+# Ensure project root is on sys.path for imports
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+import geopandas as gpd
+import rasterio
+from rasterio import features
+import pandas as pd
+import numpy as np
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.errors import WindowError
+from config import *
+from profiling import timer
+from raster_io import iter_windows
+
+def load_administrative_data():
+    """Load district and taluk boundaries"""
+    
+    print("🗺️ Loading administrative boundaries...")
+    
+    try:
+        districts = gpd.read_file(DISTRICTS_SHP)
+        taluks = gpd.read_file(TALUKS_SHP)
+        print(f"✅ Loaded {len(districts)} districts and {len(taluks)} taluks")
+        return districts, taluks
+    except Exception as e:
+        print(f"❌ Error loading boundaries: {e}")
+        # Create dummy data for demonstration
+        return None, None
+
+def _label_window(shapes, out_shape, transform):
+    """Burn (geometry, label) pairs into an int32 label array (0 = no zone)"""
+    if not shapes:
+        return np.zeros(out_shape, dtype=np.int32)
+    return features.rasterize(
+        shapes,
+        out_shape=out_shape,
+        transform=transform,
+        fill=0,
+        dtype='int32'
+    )
+
+def _zone_class_counts(src, geometries, window_size=ZONAL_WINDOW_SIZE, parent_geometries=None):
+    """Count pixels per zone and class in a single pass over the raster
+    
+    Every zone is burned into an integer label raster (zone i -> label i+1,
+    0 = outside all zones) and the zone x class counts are taken from one
+    2-D bincount per window. Returns an int64 array of shape
+    (len(geometries) + 1, 256) indexed by [label, class]. Where zones
+    overlap, the later geometry wins.
+    
+    If ``parent_geometries`` is given, pixels that fall outside every zone
+    are also counted per parent zone in the same pass, and a second array
+    of shape (len(parent_geometries) + 1, 256) is returned with them.
+    """
+    
+    n_labels = len(geometries) + 1
+    shapes = [(geom, label) for label, geom in enumerate(geometries, start=1) if geom is not None]
+    counts = np.zeros(n_labels * 256, dtype=np.int64)
+    
+    if parent_geometries is not None:
+        n_parent_labels = len(parent_geometries) + 1
+        parent_shapes = [(geom, label) for label, geom in enumerate(parent_geometries, start=1)
+                         if geom is not None]
+        residual_counts = np.zeros(n_parent_labels * 256, dtype=np.int64)
+    
+    for window in iter_windows(src, window_size):
+        n_pixels = window.width * window.height
+        with timer('raster_read', pixels=n_pixels):
+            raster_data = src.read(1, window=window)
+        window_transform = src.window_transform(window)
+        with timer('zonal_rasterize', pixels=n_pixels):
+            labels = _label_window(shapes, raster_data.shape, window_transform)
+        
+        with timer('zonal_bincount', pixels=n_pixels):
+            keys = labels.ravel().astype(np.int64) * 256 + raster_data.ravel()
+            counts += np.bincount(keys, minlength=n_labels * 256)
+        
+        if parent_geometries is not None:
+            outside = labels == 0
+            if outside.any():
+                parent_labels = _label_window(parent_shapes, raster_data.shape, window_transform)
+                keys = parent_labels[outside].astype(np.int64) * 256 + raster_data[outside]
+                residual_counts += np.bincount(keys, minlength=n_parent_labels * 256)
+    
+    counts = counts.reshape(n_labels, 256)
+    if parent_geometries is not None:
+        return counts, residual_counts.reshape(n_parent_labels, 256)
+    return counts
+
+def _windowed_zone_class_counts(prediction_path, geometries, workers=ZONAL_WORKERS,
+                                exclude_geometries=None):
+    """Count pixels per zone and class, reading only each zone's window
+    
+    Each zone reads the raster window covering its bounds and masks it with
+    a window-sized geometry mask, so memory per task scales with the zone
+    rather than the raster. Zones run concurrently on a thread pool with one
+    dataset handle per thread. Returns the same (zones + 1, 256) layout as
+    _zone_class_counts; row 0 (outside all zones) is not computed here and
+    is left empty.
+    
+    If ``exclude_geometries`` is given, pixels of a zone that are covered by
+    any of them are not counted, e.g. district pixels outside every taluk.
+    """
+    
+    exclude_geometries = [geom for geom in (exclude_geometries or [])
+                          if geom is not None and not geom.is_empty]
+    local = threading.local()
+    opened = []
+    
+    def zone_counts(geometry):
+        counts = np.zeros(256, dtype=np.int64)
+        if geometry is None or geometry.is_empty:
+            return counts
+        
+        src = getattr(local, 'src', None)
+        if src is None:
+            src = local.src = rasterio.open(prediction_path)
+            opened.append(src)
+        
+        try:
+            window = features.geometry_window(src, [geometry])
+        except WindowError:
+            # Zone lies outside the raster
+            return counts
+        
+        with timer('zonal_mask', pixels=window.width * window.height):
+            raster_data = src.read(1, window=window)
+            mask = features.geometry_mask(
+                [geometry],
+                out_shape=raster_data.shape,
+                transform=src.window_transform(window),
+                invert=True
+            )
+            excluded = [geom for geom in exclude_geometries if geom.intersects(geometry)]
+            if excluded:
+                mask &= features.geometry_mask(
+                    excluded,
+                    out_shape=raster_data.shape,
+                    transform=src.window_transform(window)
+                )
+            counts += np.bincount(raster_data[mask], minlength=256)
+        return counts
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(zone_counts, geometries))
+    finally:
+        for src in opened:
+            src.close()
+    
+    return np.vstack([np.zeros(256, dtype=np.int64)] + rows)
+
+ZONAL_COLUMNS = ['Region_Type', 'Region_Name', 'Cluster_ID', 'Crop_Type',
+                 'Area_ha', 'Pixel_Count', 'Percentage']
+
+def _counts_to_frame(zone_counts, region_names, output_name, pixel_area_ha):
+    """Turn a (zones, classes) count array into the zonal statistics table"""
+    
+    results = []
+    for region_name, class_counts in zip(region_names, zone_counts):
+        # Percentages are of the zone's classified pixels, not its nodata
+        total = class_counts[1:].sum()
+        if total == 0:
+            continue
+        
+        for cluster_id in np.flatnonzero(class_counts):
+            if cluster_id > 0:  # Skip background
+                count = class_counts[cluster_id]
+                results.append({
+                    'Region_Type': output_name,
+                    'Region_Name': region_name,
+                    'Cluster_ID': cluster_id,
+                    'Crop_Type': CROP_NAMES.get(cluster_id, f'Class {cluster_id}'),
+                    'Area_ha': count * pixel_area_ha,
+                    'Pixel_Count': count,
+                    'Percentage': (count / total) * 100
+                })
+    
+    return pd.DataFrame(results, columns=ZONAL_COLUMNS)
+
+def calculate_zonal_statistics(prediction_path, administrative_gdf, name_column, output_name,
+                               mode=ZONAL_STATS_MODE, workers=ZONAL_WORKERS):
+    """Calculate crop areas by administrative boundaries
+    
+    ``mode`` selects the counting engine: 'label' rasterizes all zones in
+    one pass, 'windowed' reads each zone's bounding window on ``workers``
+    threads.
+    """
+    
+    print(f"📊 Calculating zonal statistics for {output_name}...")
+    
+    with rasterio.open(prediction_path) as src:
+        transform = src.transform
+        crs = src.crs
+        
+        # Ensure geometries are in same CRS
+        if crs is not None and administrative_gdf.crs is not None and administrative_gdf.crs != crs:
+            administrative_gdf = administrative_gdf.to_crs(crs)
+        geometries = list(administrative_gdf.geometry)
+        
+        if mode == 'windowed':
+            zone_counts = _windowed_zone_class_counts(prediction_path, geometries, workers)
+        elif mode == 'label':
+            zone_counts = _zone_class_counts(src, geometries)
+        else:
+            raise ValueError(f"Unknown zonal statistics mode: {mode}")
+        
+        # Calculate pixel area in hectares
+        pixel_area_ha = abs(transform[0] * transform[4]) / 10000
+        
+        # Row 0 holds pixels outside every zone
+        return _counts_to_frame(
+            zone_counts[1:], administrative_gdf[name_column], output_name, pixel_area_ha
+        )
+
+def _parent_index(child_gdf, parent_gdf, parent_column):
+    """Index of the parent zone for each child zone (-1 if none)
+    
+    Children are matched on ``parent_column`` when both layers carry it,
+    otherwise by the parent polygon containing the child's representative
+    point.
+    """
+    
+    if parent_column in child_gdf.columns and parent_column in parent_gdf.columns:
+        positions = {name: i for i, name in enumerate(parent_gdf[parent_column])}
+        return np.array([positions.get(name, -1) for name in child_gdf[parent_column]], dtype=np.int64)
+    
+    points = gpd.GeoDataFrame(geometry=child_gdf.geometry.representative_point(), crs=child_gdf.crs)
+    parents = gpd.GeoDataFrame(
+        {'_parent': np.arange(len(parent_gdf))}, geometry=parent_gdf.geometry.values, crs=parent_gdf.crs
+    )
+    joined = gpd.sjoin(points.reset_index(drop=True), parents, how='left', predicate='within')
+    joined = joined[~joined.index.duplicated(keep='first')]
+    return joined['_parent'].fillna(-1).astype(np.int64).to_numpy()
+
+def rollup_zone_counts(child_counts, parent_index, n_parents):
+    """Sum (children + 1, 256) zone counts into (parents + 1, 256) parent counts
+    
+    Children without a parent are added to row 0 (outside all zones).
+    """
+    
+    parent_counts = np.zeros((n_parents + 1, child_counts.shape[1]), dtype=np.int64)
+    parent_counts[0] = child_counts[0]
+    np.add.at(parent_counts, parent_index + 1, child_counts[1:])
+    return parent_counts
+
+def hierarchical_zone_counts(prediction_path, districts, taluks, district_column='DISTRICT',
+                             mode=ZONAL_STATS_MODE, workers=ZONAL_WORKERS):
+    """Count a class raster per taluk and roll the counts up to districts
+    
+    Boundaries are reprojected to the raster CRS. District counts are the
+    sum of their taluks plus any district pixels not covered by a taluk,
+    which the 'label' engine counts in the same pass and the 'windowed'
+    engine counts per district window. Returns
+    (district_counts, taluk_counts, pixel_area_ha) with (zones + 1, 256)
+    count arrays indexed by [zone label, class].
+    """
+    
+    with rasterio.open(prediction_path) as src:
+        transform = src.transform
+        crs = src.crs
+        
+        # Ensure geometries are in same CRS
+        if crs is not None:
+            if districts.crs is not None and districts.crs != crs:
+                districts = districts.to_crs(crs)
+            if taluks.crs is not None and taluks.crs != crs:
+                taluks = taluks.to_crs(crs)
+        
+        if mode == 'windowed':
+            taluk_counts = _windowed_zone_class_counts(prediction_path, list(taluks.geometry), workers)
+            residual_counts = _windowed_zone_class_counts(
+                prediction_path, list(districts.geometry), workers,
+                exclude_geometries=list(taluks.geometry)
+            )
+        elif mode == 'label':
+            taluk_counts, residual_counts = _zone_class_counts(
+                src, list(taluks.geometry), parent_geometries=list(districts.geometry)
+            )
+        else:
+            raise ValueError(f"Unknown zonal statistics mode: {mode}")
+        
+        pixel_area_ha = abs(transform[0] * transform[4]) / 10000
+    
+    parent_index = _parent_index(taluks, districts, district_column)
+    district_counts = rollup_zone_counts(taluk_counts, parent_index, len(districts))
+    # Reconcile district pixels that fall outside every taluk
+    district_counts[1:] += residual_counts[1:]
+    return district_counts, taluk_counts, pixel_area_ha
+
+def calculate_hierarchical_statistics(prediction_path, districts, taluks,
+                                      district_column='DISTRICT', taluk_column='TALUK',
+                                      include_state=REPORT_STATE_LEVEL,
+                                      mode=ZONAL_STATS_MODE, workers=ZONAL_WORKERS):
+    """Calculate taluk statistics once and roll them up to districts (and state)
+    
+    Levels are consistent with each other by construction; see
+    hierarchical_zone_counts.
+    """
+    
+    print("📊 Calculating zonal statistics for Taluk (rolled up to District)...")
+    district_counts, taluk_counts, pixel_area_ha = hierarchical_zone_counts(
+        prediction_path, districts, taluks, district_column, mode, workers
+    )
+    
+    stats = {
+        'District': _counts_to_frame(district_counts[1:], districts[district_column], 'District', pixel_area_ha),
+        'Taluk': _counts_to_frame(taluk_counts[1:], taluks[taluk_column], 'Taluk', pixel_area_ha)
+    }
+    if include_state:
+        state_counts = district_counts[1:].sum(axis=0, keepdims=True)
+        stats['State'] = _counts_to_frame(state_counts, [STATE_NAME], 'State', pixel_area_ha)
+    
+    return stats
+
+def generate_reports(prediction_path, reports_dir=None, boundaries=None):
+    """Generate comprehensive reports
+    
+    Reports go to ``reports_dir`` (default outputs/reports). Already
+    loaded (districts, taluks) ``boundaries`` skip reading the shapefiles.
+    """
+    
+    districts, taluks = boundaries if boundaries is not None else load_administrative_data()
+    
+    if districts is not None:
+        # Taluk-wise analysis, rolled up to districts
+        stats = calculate_hierarchical_statistics(prediction_path, districts, taluks)
+        district_stats = stats['District']
+        taluk_stats = stats['Taluk']
+        
+        # Save reports
+        reports_dir = reports_dir or os.path.join(OUTPUT_DIR, 'reports')
+        os.makedirs(reports_dir, exist_ok=True)
+        district_stats.to_csv(
+            os.path.join(reports_dir, 'districtwise_crop_area_2025.csv'), 
+            index=False
+        )
+        taluk_stats.to_csv(
+            os.path.join(reports_dir, 'talukwise_crop_area_2025.csv'), 
+            index=False
+        )
+        if 'State' in stats:
+            stats['State'].to_csv(
+                os.path.join(reports_dir, 'statewise_crop_area_2025.csv'),
+                index=False
+            )
+        
+        print("📈 Summary Statistics:")
+        print(f"📊 Total crop area analyzed: {district_stats['Area_ha'].sum():,.1f} ha")
+        
+        return district_stats, taluk_stats
+    else:
+        print("⚠️ Using demo mode - no shapefiles available")
+        return None, None
+
+if __name__ == "__main__":
+    prediction_path = PREDICTION_PATH
     district_stats, taluk_stats = generate_reports(prediction_path)
\ No newline at end of file
@@ -1,118 +1,299 @@
-# scripts/05_visualization.py
-import sys
-import os
-# Ensure project root is on sys.path for imports
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
-if PROJECT_ROOT not in sys.path:
-    sys.path.insert(0, PROJECT_ROOT)
-import matplotlib.pyplot as plt
-import rasterio
-import geopandas as gpd
-import numpy as np
-import pandas as pd
-from config import *
-
-def create_enhanced_map(prediction_path, output_map_path):
-    """Create publication-quality crop map"""
-    
-    print("🎨 Creating enhanced visualization...")
-    
-    # Load prediction data
-    with rasterio.open(prediction_path) as src:
-        prediction_data = src.read(1)
-        bounds = src.bounds
-        extent = [bounds.left, bounds.right, bounds.bottom, bounds.top]
-    
-    # Create figure
-    fig, ax = plt.subplots(1, 1, figsize=(15, 12))
-    
-    # Create custom colormap
-    from matplotlib.colors import ListedColormap
-    colors = [COLOR_MAP.get(i, '#FFFFFF') for i in range(1, 5)]
-    cmap = ListedColormap(colors)
-    
-    # Plot prediction data (skip background 0 values)
-    plot_data = np.ma.masked_where(prediction_data == 0, prediction_data)
-    im = ax.imshow(plot_data, extent=extent, cmap=cmap, alpha=0.8, interpolation='nearest')
-    
-    # Add grid
-    ax.grid(True, alpha=0.3)
-    ax.set_axisbelow(True)
-    
-    # Add scale bar (simplified)
-    from matplotlib_scalebar.scalebar import ScaleBar
-    ax.add_artist(ScaleBar(1, location='lower left', box_alpha=0.8))
-    
-    # Create legend
-    legend_patches = []
-    for cluster_id, crop_name in CROP_NAMES.items():
-        legend_patches.append(
-            plt.Rectangle((0, 0), 1, 1, fc=COLOR_MAP[cluster_id], label=crop_name)
-        )
-    
-    ax.legend(handles=legend_patches, loc='upper right', framealpha=0.9)
-    
-    # Labels and title
-    ax.set_title('Tumkur District - Crop Classification 2025', fontsize=16, fontweight='bold')
-    ax.set_xlabel('Longitude', fontsize=12)
-    ax.set_ylabel('Latitude', fontsize=12)
-    
-    # Add north arrow
-    x, y, arrow_length = 0.95, 0.95, 0.1
-    ax.annotate('N', xy=(x, y), xytext=(x, y-arrow_length),
-                arrowprops=dict(facecolor='black', width=5, headwidth=15),
-                ha='center', va='center', fontsize=20,
-                xycoords=ax.transAxes)
-    
-    plt.tight_layout()
-    
-    # Save high-quality output
-    os.makedirs(os.path.dirname(output_map_path), exist_ok=True)
-    plt.savefig(output_map_path, dpi=300, bbox_inches='tight', facecolor='white')
-    plt.show()
-    
-    print(f"💾 Map saved: {output_map_path}")
-
-def create_pie_chart(district_stats_path):
-    """Create crop distribution pie chart"""
-    
-    if os.path.exists(district_stats_path):
-        df = pd.read_csv(district_stats_path)
-        
-        # Aggregate by crop type
-        crop_summary = df.groupby('Crop_Type')['Area_ha'].sum().sort_values(ascending=False)
-        
-        # Create pie chart
-        plt.figure(figsize=(10, 8))
-        colors = [COLOR_MAP.get(i, '#CCCCCC') for i in range(1, len(crop_summary)+1)]
-        
-        wedges, texts, autotexts = plt.pie(crop_summary.values, 
-                                          labels=crop_summary.index,
-                                          colors=colors,
-                                          autopct='%1.1f%%',
-                                          startangle=90)
-        
-        # Enhance text
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
-        
-        plt.title('Crop Distribution - Tumkur District 2025', fontsize=14, fontweight='bold')
-        plt.tight_layout()
-        
-        pie_chart_path = os.path.join(OUTPUT_DIR, 'maps', 'crop_distribution_pie.png')
-        plt.savefig(pie_chart_path, dpi=300, bbox_inches='tight')
-        plt.show()
-        
-        print(f"📊 Pie chart saved: {pie_chart_path}")
-
-if __name__ == "__main__":
-    prediction_path = os.path.join(OUTPUT_DIR, 'predictions', 'tumkur_2025_prediction.tif')
-    output_map_path = os.path.join(OUTPUT_DIR, 'maps', 'enhanced_crop_map_2025.png')
-    
-    create_enhanced_map(prediction_path, output_map_path)
-    
-    # Create pie chart if data available
-    district_stats_path = os.path.join(OUTPUT_DIR, 'reports', 'districtwise_crop_area_2025.csv')
+# scripts/05_visualization.py
+import sys
+import os
+# Ensure project root is on sys.path for imports
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+import argparse
+import re
+from multiprocessing import Pool
+import matplotlib
+import matplotlib.pyplot as plt
+import rasterio
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import ListedColormap
+from matplotlib.figure import Figure
+from rasterio import features
+from rasterio.errors import WindowError
+from config import *
+from profiling import timer
+from raster_io import decimated_shape, pool_size, read_decimated
+
+# Backends that cannot open a window; figures are only saved there
+NON_INTERACTIVE_BACKENDS = {'agg', 'cairo', 'pdf', 'pgf', 'ps', 'svg', 'template'}
+
+def show_figure(fig):
+    """Show a figure without blocking, then release it
+    
+    Headless backends (e.g. Agg in batch runs) skip the display entirely.
+    """
+    if matplotlib.get_backend().lower() not in NON_INTERACTIVE_BACKENDS:
+        plt.show(block=False)
+        plt.pause(0.001)
+    plt.close(fig)
+
+def create_enhanced_map(prediction_path, output_map_path, figsize=(15, 12), dpi=300):
+    """Create publication-quality crop map
+    
+    The prediction is read at the pixel grid of the saved figure
+    (``figsize`` x ``dpi``) with mode resampling, from the raster's
+    overviews when it has them, so render time and memory depend on the
+    figure size rather than on the raster size.
+    """
+    
+    print("🎨 Creating enhanced visualization...")
+    
+    # Load prediction data at the resolution the figure can show
+    max_width, max_height = int(figsize[0] * dpi), int(figsize[1] * dpi)
+    with rasterio.open(prediction_path) as src:
+        rows, cols = decimated_shape(src, max_width, max_height)
+        with timer('raster_read', pixels=rows * cols):
+            prediction_data = read_decimated(src, max_width, max_height)
+        bounds = src.bounds
+        extent = [bounds.left, bounds.right, bounds.bottom, bounds.top]
+    
+    # Create figure
+    fig, ax = plt.subplots(1, 1, figsize=figsize)
+    
+    # Create custom colormap
+    from matplotlib.colors import ListedColormap
+    colors = [COLOR_MAP.get(i, '#FFFFFF') for i in range(1, 5)]
+    cmap = ListedColormap(colors)
+    
+    # Plot prediction data (skip nodata values)
+    plot_data = np.ma.masked_where(prediction_data == NODATA_CLASS, prediction_data)
+    im = ax.imshow(plot_data, extent=extent, cmap=cmap, alpha=0.8, interpolation='nearest')
+    
+    # Add grid
+    ax.grid(True, alpha=0.3)
+    ax.set_axisbelow(True)
+    
+    # Add scale bar (simplified)
+    from matplotlib_scalebar.scalebar import ScaleBar
+    ax.add_artist(ScaleBar(1, location='lower left', box_alpha=0.8))
+    
+    # Create legend
+    legend_patches = []
+    for cluster_id, crop_name in CROP_NAMES.items():
+        legend_patches.append(
+            plt.Rectangle((0, 0), 1, 1, fc=COLOR_MAP[cluster_id], label=crop_name)
+        )
+    
+    ax.legend(handles=legend_patches, loc='upper right', framealpha=0.9)
+    
+    # Labels and title
+    ax.set_title('Tumkur District - Crop Classification 2025', fontsize=16, fontweight='bold')
+    ax.set_xlabel('Longitude', fontsize=12)
+    ax.set_ylabel('Latitude', fontsize=12)
+    
+    # Add north arrow
+    x, y, arrow_length = 0.95, 0.95, 0.1
+    ax.annotate('N', xy=(x, y), xytext=(x, y-arrow_length),
+                arrowprops=dict(facecolor='black', width=5, headwidth=15),
+                ha='center', va='center', fontsize=20,
+                xycoords=ax.transAxes)
+    
+    plt.tight_layout()
+    
+    # Save high-quality output
+    os.makedirs(os.path.dirname(output_map_path), exist_ok=True)
+    with timer('render_map'):
+        plt.savefig(output_map_path, dpi=dpi, bbox_inches='tight', facecolor='white')
+    show_figure(fig)
+    
+    print(f"💾 Map saved: {output_map_path}")
+
+def create_pie_chart(district_stats_path, district_stats=None):
+    """Create crop distribution pie chart
+    
+    ``district_stats`` can be passed in memory instead of reading the CSV.
+    """
+    
+    if district_stats is not None or os.path.exists(district_stats_path):
+        df = district_stats if district_stats is not None else pd.read_csv(district_stats_path)
+        
+        # Aggregate by crop type
+        crop_summary = df.groupby('Crop_Type')['Area_ha'].sum().sort_values(ascending=False)
+        
+        # Create pie chart
+        fig = plt.figure(figsize=(10, 8))
+        colors = [COLOR_MAP.get(i, '#CCCCCC') for i in range(1, len(crop_summary)+1)]
+        
+        wedges, texts, autotexts = plt.pie(crop_summary.values, 
+                                          labels=crop_summary.index,
+                                          colors=colors,
+                                          autopct='%1.1f%%',
+                                          startangle=90)
+        
+        # Enhance text
+        for autotext in autotexts:
+            autotext.set_color('white')
+            autotext.set_fontweight('bold')
+        
+        plt.title('Crop Distribution - Tumkur District 2025', fontsize=14, fontweight='bold')
+        plt.tight_layout()
+        
+        pie_chart_path = os.path.join(OUTPUT_DIR, 'maps', 'crop_distribution_pie.png')
+        with timer('render_pie'):
+            plt.savefig(pie_chart_path, dpi=300, bbox_inches='tight')
+        show_figure(fig)
+        
+        print(f"📊 Pie chart saved: {pie_chart_path}")
+
+# Boundary layer and name column of each atlas level
+ATLAS_LEVELS = {
+    'district': (DISTRICTS_SHP, 'DISTRICT'),
+    'taluk': (TALUKS_SHP, 'TALUK')
+}
+
+# Per-process prediction raster for atlas workers
+_atlas_src = None
+
+def _init_atlas_worker(prediction_path):
+    """Open the prediction raster once per worker process"""
+    global _atlas_src
+    _atlas_src = rasterio.open(prediction_path)
+
+def _slug(name):
+    return re.sub(r'[^0-9a-z]+', '_', str(name).lower()).strip('_') or 'unit'
+
+def _draw_outline(ax, geometry):
+    for polygon in getattr(geometry, 'geoms', [geometry]):
+        x, y = polygon.exterior.xy
+        ax.plot(x, y, color='black', linewidth=1)
+
+def _render_unit(task):
+    """Render one unit's map and pie chart and return its index row
+    
+    Only the unit's window of the prediction raster is read, decimated to
+    at most ``map_size`` pixels a side. Figures are drawn directly on Agg
+    canvases, so workers never touch pyplot state.
+    """
+    unit_id, name, geometry, map_path, pie_path, map_size = task
+    row = {'Unit_ID': unit_id, 'Region_Name': name, 'Map': None, 'Pie_Chart': None, 'Dominant_Crop': None}
+    
+    try:
+        window = features.geometry_window(_atlas_src, [geometry])
+    except WindowError:
+        # Unit lies outside the raster
+        return row
+    
+    data = read_decimated(_atlas_src, map_size, map_size, window=window)
+    transform = _atlas_src.window_transform(window) * rasterio.Affine.scale(
+        window.width / data.shape[1], window.height / data.shape[0]
+    )
+    inside = features.geometry_mask([geometry], out_shape=data.shape, transform=transform, invert=True)
+    data = np.where(inside, data, NODATA_CLASS)
+    counts = np.bincount(data.ravel(), minlength=256)
+    counts[NODATA_CLASS] = 0
+    
+    left, bottom, right, top = _atlas_src.window_bounds(window)
+    class_ids = sorted(CROP_NAMES)
+    cmap = ListedColormap([COLOR_MAP[i] for i in class_ids])
+    
+    # Fixed margins instead of bbox_inches='tight', which draws every figure twice
+    fig = Figure(figsize=(8, 8))
+    FigureCanvasAgg(fig)
+    fig.subplots_adjust(left=0.1, right=0.97, bottom=0.07, top=0.93)
+    ax = fig.subplots()
+    ax.imshow(np.ma.masked_equal(data, NODATA_CLASS), extent=[left, right, bottom, top], cmap=cmap,
+              vmin=class_ids[0] - 0.5, vmax=class_ids[-1] + 0.5, interpolation='nearest')
+    _draw_outline(ax, geometry)
+    ax.legend(handles=[plt.Rectangle((0, 0), 1, 1, fc=COLOR_MAP[i], label=CROP_NAMES[i]) for i in class_ids],
+              loc='upper right', framealpha=0.9, fontsize=8)
+    ax.set_title(f'{name} - Crop Classification 2025', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Longitude')
+    ax.set_ylabel('Latitude')
+    fig.savefig(map_path, dpi=map_size / 8, facecolor='white')
+    row['Map'] = os.path.basename(map_path)
+    
+    present = [i for i in class_ids if counts[i] > 0]
+    if present:
+        fig = Figure(figsize=(6, 6))
+        FigureCanvasAgg(fig)
+        fig.subplots_adjust(left=0.05, right=0.95, bottom=0.15, top=0.9)
+        ax = fig.subplots()
+        wedges, _, _ = ax.pie([counts[i] for i in present], colors=[COLOR_MAP[i] for i in present],
+                              autopct='%1.1f%%', startangle=90)
+        ax.legend(wedges, [CROP_NAMES[i] for i in present], loc='upper center',
+                  bbox_to_anchor=(0.5, 0.0), ncol=2, fontsize=8, frameon=False)
+        ax.set_title(f'Crop Distribution - {name} 2025', fontsize=12, fontweight='bold')
+        fig.savefig(pie_path, dpi=100)
+        row['Pie_Chart'] = os.path.basename(pie_path)
+        row['Dominant_Crop'] = CROP_NAMES[max(present, key=lambda i: counts[i])]
+    
+    return row
+
+def create_atlas(prediction_path, level='taluk', workers=ATLAS_WORKERS, map_size=ATLAS_MAP_SIZE):
+    """Render one crop map and one pie chart per district or taluk
+    
+    Units are sorted by name and numbered, so file names
+    (``<unit_id>_<name>_map.png`` / ``_pie.png``) are deterministic across
+    runs. Units are rendered by a process pool (``workers=0`` uses every
+    core) and listed in ``index.csv`` in ATLAS_DIR/<level>.
+    """
+    
+    print(f"🗂️ Creating {level} atlas...")
+    
+    shapefile, name_column = ATLAS_LEVELS[level]
+    units = gpd.read_file(shapefile)
+    with rasterio.open(prediction_path) as src:
+        if src.crs is not None and units.crs is not None and units.crs != src.crs:
+            units = units.to_crs(src.crs)
+    units = units[units.geometry.notna() & ~units.geometry.is_empty]
+    units = units.sort_values(name_column, kind='stable')
+    
+    atlas_dir = os.path.join(ATLAS_DIR, level)
+    os.makedirs(atlas_dir, exist_ok=True)
+    
+    tasks = []
+    for unit_id, (name, geometry) in enumerate(zip(units[name_column], units.geometry), start=1):
+        stem = os.path.join(atlas_dir, f"{unit_id:04d}_{_slug(name)}")
+        tasks.append((unit_id, name, geometry, f"{stem}_map.png", f"{stem}_pie.png", map_size))
+    
+    workers = pool_size(workers, len(tasks))
+    
+    with timer('render_atlas'):
+        if workers == 1:
+            _init_atlas_worker(prediction_path)
+            try:
+                rows = [_render_unit(task) for task in tasks]
+            finally:
+                _atlas_src.close()
+        else:
+            with Pool(workers, initializer=_init_atlas_worker, initargs=(prediction_path,)) as pool:
+                rows = pool.map(_render_unit, tasks, chunksize=1)
+    
+    index_path = os.path.join(atlas_dir, 'index.csv')
+    pd.DataFrame(rows, columns=['Unit_ID', 'Region_Name', 'Map', 'Pie_Chart', 'Dominant_Crop']).to_csv(
+        index_path, index=False
+    )
+    print(f"💾 Atlas of {len(rows)} {level} units saved: {index_path}")
+    
+    return index_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create crop maps and charts")
+    parser.add_argument('--atlas', choices=sorted(ATLAS_LEVELS),
+                        help="Render a per-unit atlas instead of the overall map")
+    parser.add_argument('--workers', type=int, default=ATLAS_WORKERS,
+                        help="Worker processes for the atlas (0 = all cores)")
+    args = parser.parse_args()
+    
+    prediction_path = PREDICTION_PATH
+    if args.atlas:
+        create_atlas(prediction_path, args.atlas, workers=args.workers)
+        sys.exit(0)
+    
+    output_map_path = os.path.join(OUTPUT_DIR, 'maps', 'enhanced_crop_map_2025.png')
+    
+    create_enhanced_map(prediction_path, output_map_path)
+    
+    # Create pie chart if data available
+    district_stats_path = os.path.join(OUTPUT_DIR, 'reports', 'districtwise_crop_area_2025.csv')
     create_pie_chart(district_stats_path)
\ No newline at end of file
@@ -1,99 +1,194 @@
-# scripts/06_dashboard.py
-import sys
-import os
-# Ensure project root is on sys.path for imports
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
-if PROJECT_ROOT not in sys.path:
-    sys.path.insert(0, PROJECT_ROOT)
-
-import folium
-import geopandas as gpd
-import rasterio
-import json
-from config import *
-
-def create_interactive_map(prediction_path):
-    """Create interactive Folium map"""
-    
-    print("🌐 Creating interactive map...")
-    
-    # Get bounds from prediction raster
-    with rasterio.open(prediction_path) as src:
-        bounds = src.bounds
-        transform = src.transform
-    
-    # Calculate center
-    center_lat = (bounds.bottom + bounds.top) / 2
-    center_lon = (bounds.left + bounds.right) / 2
-    
-    # Create base map
-    m = folium.Map(
-        location=[center_lat, center_lon],
-        zoom_start=10,
-        tiles='OpenStreetMap'
-    )
-    
-    # Add satellite imagery
-    folium.TileLayer(
-        tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
-        attr='Esri',
-        name='Satellite',
-        overlay=False,
-        control=True
-    ).add_to(m)
-    
-    # Add district boundaries if available
-    try:
-        districts = gpd.read_file(DISTRICTS_SHP)
-        
-        # Filter for Tumkur district
-        tumkur_district = districts[districts['DISTRICT'] == 'TUMKUR']
-        
-        folium.GeoJson(
-            tumkur_district.to_json(),
-            name='District Boundaries',
-            style_function=lambda x: {
-                'fillColor': 'none',
-                'color': 'blue',
-                'weight': 3,
-                'fillOpacity': 0
-            },
-            tooltip=folium.GeoJsonTooltip(fields=['DISTRICT', 'TALUK'], aliases=['District:', 'Taluk:'])
-        ).add_to(m)
-    except Exception as e:
-        print(f"⚠️ Could not load district boundaries: {e}")
-    
-    # Add legend
-    legend_html = '''
-    <div style="position: fixed; 
-                top: 10px; left: 50px; width: 200px; height: auto; 
-                background-color: white; border:2px solid grey; z-index:9999; 
-                font-size:14px; padding: 10px">
-    <p><strong>🌾 Crop Legend</strong></p>
-    '''
-    
-    for cluster_id, crop_name in CROP_NAMES.items():
-        color = COLOR_MAP[cluster_id]
-        legend_html += f'<p><i style="background:{color}; width:20px; height:20px; display:inline-block; margin-right:5px;"></i> {crop_name}</p>'
-    
-    legend_html += '</div>'
-    
-    m.get_root().html.add_child(folium.Element(legend_html))
-    
-    # Add layer control
-    folium.LayerControl().add_to(m)
-    
-    # Save map
-    map_path = os.path.join(OUTPUT_DIR, 'maps', 'interactive_crop_map.html')
-    os.makedirs(os.path.dirname(map_path), exist_ok=True)
-    m.save(map_path)
-    
-    print(f"💾 Interactive map saved: {map_path}")
-    print("📍 Open the HTML file in your browser to view the interactive map!")
-    
-    return map_path
-
-if __name__ == "__main__":
-    prediction_path = os.path.join(OUTPUT_DIR, 'predictions', 'tumkur_2025_prediction.tif')
+# scripts/06_dashboard.py
+import sys
+import os
+# Ensure project root is on sys.path for imports
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import folium
+import rasterio
+import json
+from folium.template import Template
+from config import *
+from tile_pyramid import build_tile_pyramid
+from vector_layers import layer_for_zoom, prepare_vector_layers
+
+class ZoomSwitch(folium.MacroElement):
+    """Keep only the layer of a group prepared for the map's current zoom
+
+    ``by_zoom[z]`` is the index in ``layers`` of the layer shown at zoom z;
+    zooms past the end of the list use its last entry.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var group = {{ this.group.get_name() }};
+            var layers = [{% for layer in this.layers %}{{ layer.get_name() }}, {% endfor %}];
+            var byZoom = {{ this.by_zoom|tojson }};
+            function update() {
+                var zoom = Math.min(Math.max(Math.round(map.getZoom()), 0), byZoom.length - 1);
+                layers.forEach(function(layer, i) {
+                    if (i === byZoom[zoom]) {
+                        group.addLayer(layer);
+                    } else {
+                        group.removeLayer(layer);
+                    }
+                });
+            }
+            map.on('zoomend', update);
+            update();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, group, layers, by_zoom):
+        super().__init__()
+        self._name = 'ZoomSwitch'
+        self.group = group
+        self.layers = layers
+        self.by_zoom = by_zoom
+
+def _load_layer(path, district=None):
+    """One prepared boundary layer, optionally limited to one district"""
+    with open(path) as f:
+        layer = json.load(f)
+    if district is not None and any('DISTRICT' in feature['properties'] for feature in layer['features']):
+        layer['features'] = [feature for feature in layer['features']
+                             if feature['properties'].get('DISTRICT') == district]
+    return layer
+
+def _tooltip_fields(layer, fields):
+    """The subset of ``fields`` present in the layer's features"""
+    present = layer['features'][0]['properties'] if layer['features'] else {}
+    return [field for field in fields if field in present]
+
+def add_boundary_layers(m, shapefile, name_column, stats_name, name, fields, style, district=None):
+    """Add a boundary group holding one simplified layer per prepared zoom
+
+    Every layer of VECTOR_ZOOMS is embedded and the map shows the one
+    layer_for_zoom picks for its current zoom, switching on zoom changes.
+    """
+    stats_path = os.path.join(OUTPUT_DIR, 'reports', stats_name)
+    paths = prepare_vector_layers(shapefile, name_column, stats_path=stats_path)
+    zooms = sorted(paths)
+    layers = [_load_layer(paths[z], district) for z in zooms]
+    fields = _tooltip_fields(layers[-1], fields)
+    
+    group = folium.FeatureGroup(name=name).add_to(m)
+    geojsons = [
+        folium.GeoJson(
+            layer,
+            style_function=lambda x: style,
+            tooltip=folium.GeoJsonTooltip(fields=fields, aliases=[f"{field}:" for field in fields])
+        ).add_to(group)
+        for layer in layers
+    ]
+    order = [paths[z] for z in zooms]
+    by_zoom = [order.index(layer_for_zoom(paths, zoom)) for zoom in range(zooms[-1] + 1)]
+    ZoomSwitch(group, geojsons, by_zoom).add_to(m)
+
+def create_interactive_map(prediction_path):
+    """Create interactive Folium map"""
+    
+    print("🌐 Creating interactive map...")
+    
+    map_path = os.path.join(OUTPUT_DIR, 'maps', 'interactive_crop_map.html')
+    
+    # Get bounds from prediction raster
+    with rasterio.open(prediction_path) as src:
+        bounds = src.bounds
+        transform = src.transform
+    
+    # Calculate center
+    center_lat = (bounds.bottom + bounds.top) / 2
+    center_lon = (bounds.left + bounds.right) / 2
+    
+    # Create base map
+    m = folium.Map(
+        location=[center_lat, center_lon],
+        zoom_start=DASHBOARD_ZOOM,
+        tiles='OpenStreetMap'
+    )
+    
+    # Add satellite imagery
+    folium.TileLayer(
+        tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
+        attr='Esri',
+        name='Satellite',
+        overlay=False,
+        control=True
+    ).add_to(m)
+    
+    # Add the prediction as a local tile pyramid; only changed tiles are re-rendered
+    tiles_dir, min_zoom, max_zoom = build_tile_pyramid(prediction_path)
+    tiles_url = os.path.relpath(tiles_dir, os.path.dirname(map_path)).replace(os.sep, '/')
+    folium.TileLayer(
+        tiles=tiles_url + '/{z}/{x}/{y}.png',
+        attr='Crop classification 2025',
+        name='Crop Classification',
+        overlay=True,
+        control=True,
+        opacity=0.8,
+        min_native_zoom=min_zoom,
+        max_native_zoom=max_zoom
+    ).add_to(m)
+    
+    # Add district boundaries if available, simplified and quantized per zoom
+    try:
+        # Filter for Tumkur district
+        add_boundary_layers(
+            m, DISTRICTS_SHP, 'DISTRICT', 'districtwise_crop_area_2025.csv', 'District Boundaries',
+            ['DISTRICT', 'TALUK', 'Dominant_Crop', 'Total_ha'],
+            {'fillColor': 'none', 'color': 'blue', 'weight': 3, 'fillOpacity': 0},
+            district='TUMKUR'
+        )
+    except Exception as e:
+        print(f"⚠️ Could not load district boundaries: {e}")
+    
+    # Add taluk boundaries with their crop statistics
+    if os.path.exists(TALUKS_SHP):
+        try:
+            add_boundary_layers(
+                m, TALUKS_SHP, 'TALUK', 'talukwise_crop_area_2025.csv', 'Taluk Boundaries',
+                ['TALUK', 'Dominant_Crop', 'Total_ha'] + list(CROP_NAMES.values()),
+                {'fillColor': 'none', 'color': 'black', 'weight': 1, 'fillOpacity': 0},
+                district='TUMKUR'
+            )
+        except Exception as e:
+            print(f"⚠️ Could not load taluk boundaries: {e}")
+    
+    # Add legend
+    legend_html = '''
+    <div style="position: fixed; 
+                top: 10px; left: 50px; width: 200px; height: auto; 
+                background-color: white; border:2px solid grey; z-index:9999; 
+                font-size:14px; padding: 10px">
+    <p><strong>🌾 Crop Legend</strong></p>
+    '''
+    
+    for cluster_id, crop_name in CROP_NAMES.items():
+        color = COLOR_MAP[cluster_id]
+        legend_html += f'<p><i style="background:{color}; width:20px; height:20px; display:inline-block; margin-right:5px;"></i> {crop_name}</p>'
+    
+    legend_html += '</div>'
+    
+    m.get_root().html.add_child(folium.Element(legend_html))
+    
+    # Add layer control
+    folium.LayerControl().add_to(m)
+    
+    # Save map
+    os.makedirs(os.path.dirname(map_path), exist_ok=True)
+    m.save(map_path)
+    
+    print(f"💾 Interactive map saved: {map_path}")
+    print("📍 Open the HTML file in your browser to view the interactive map!")
+    
+    return map_path
+
+if __name__ == "__main__":
+    prediction_path = PREDICTION_PATH
     create_interactive_map(prediction_path)
\ No newline at end of file
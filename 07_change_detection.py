@@ -0,0 +1,222 @@
+# scripts/07_change_detection.py
+import sys
+import os
+# Ensure project root is on sys.path for imports
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+import argparse
+import importlib
+import rasterio
+import pandas as pd
+import numpy as np
+from config import *
+from profiling import timer
+from raster_io import iter_windows, streaming_profile
+
+# Classes 0 (nodata) .. max crop class; a transition code is before * N + after
+N_CLASSES = max(CROP_NAMES) + 1
+# Code of a pixel that is nodata in both rasters
+NODATA_TRANSITION = NODATA_CLASS * N_CLASSES + NODATA_CLASS
+
+def class_name(cls):
+    """Crop name of a class, 'No data' for NODATA_CLASS"""
+    return 'No data' if cls == NODATA_CLASS else CROP_NAMES.get(cls, f'Class {cls}')
+
+def check_aligned(before, after):
+    """Raise ValueError unless two rasters share their grid"""
+
+    if (before.width, before.height) != (after.width, after.height):
+        raise ValueError(f"Rasters differ in size: {before.width}x{before.height} vs {after.width}x{after.height}")
+    if before.crs != after.crs:
+        raise ValueError(f"Rasters differ in CRS: {before.crs} vs {after.crs}")
+    if not before.transform.almost_equals(after.transform):
+        raise ValueError("Rasters are not aligned (different transforms)")
+
+def transition_codes(before_block, after_block):
+    """uint8 transition code (before * N_CLASSES + after) of two class blocks"""
+
+    if before_block.max(initial=0) >= N_CLASSES or after_block.max(initial=0) >= N_CLASSES:
+        raise ValueError(f"Class values must be below {N_CLASSES}")
+    codes = before_block.astype(np.uint8) * np.uint8(N_CLASSES)
+    codes += after_block
+    return codes
+
+def create_transition_raster(before_path, after_path, output_path, window_size=CHANGE_WINDOW_SIZE):
+    """Stream two aligned prediction rasters into a transition-code raster
+
+    Both rasters are read window by window; each window's codes are
+    written straight to ``output_path`` and counted with one bincount, so
+    memory is bounded by the window size. Returns the (N_CLASSES,
+    N_CLASSES) pixel count matrix indexed by [before, after] and the pixel
+    area in hectares.
+    """
+
+    print("🔄 Detecting change between predictions...")
+
+    if N_CLASSES * N_CLASSES > 256:
+        raise ValueError(f"{N_CLASSES} classes do not fit uint8 transition codes")
+
+    counts = np.zeros(N_CLASSES * N_CLASSES, dtype=np.int64)
+
+    with rasterio.open(before_path) as before, rasterio.open(after_path) as after:
+        check_aligned(before, after)
+        pixel_area_ha = abs(after.transform[0] * after.transform[4]) / 10000
+
+        profile = streaming_profile(after.profile, window_size)
+        profile.update({
+            'driver': 'GTiff',
+            'dtype': rasterio.uint8,
+            'count': 1,
+            'compress': 'lzw',
+            'nodata': NODATA_TRANSITION
+        })
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with rasterio.open(output_path, 'w', **profile) as dst:
+            for window in iter_windows(after, window_size):
+                n_pixels = window.width * window.height
+                with timer('raster_read', pixels=n_pixels):
+                    before_block = before.read(1, window=window)
+                    after_block = after.read(1, window=window)
+                with timer('transition_bincount', pixels=n_pixels):
+                    codes = transition_codes(before_block, after_block)
+                    counts += np.bincount(codes.ravel(), minlength=N_CLASSES * N_CLASSES)
+                with timer('geotiff_write', pixels=n_pixels):
+                    dst.write(codes, 1, window=window)
+
+    print(f"💾 Transition raster saved: {output_path}")
+    return counts.reshape(N_CLASSES, N_CLASSES), pixel_area_ha
+
+def transition_matrix_frame(matrix, pixel_area_ha):
+    """Area (ha) transition matrix with 'before' rows and 'after' columns"""
+
+    names = [class_name(cls) for cls in range(N_CLASSES)]
+    frame = pd.DataFrame(matrix * pixel_area_ha, index=names, columns=names)
+    frame.index.name = 'From \\ To'
+    return frame
+
+TRANSITION_COLUMNS = ['Region_Type', 'Region_Name', 'From_Class', 'From_Crop', 'To_Class', 'To_Crop',
+                      'Area_ha', 'Pixel_Count', 'Percentage']
+
+def _transitions_to_frame(zone_matrices, region_names, output_name, pixel_area_ha):
+    """Long table of each zone's transitions between classified pixels
+
+    Pixels that are nodata in either raster are left out, and percentages
+    are of the zone's pixels classified in both.
+    """
+
+    results = []
+    for region_name, matrix in zip(region_names, zone_matrices):
+        classified = matrix.copy()
+        classified[NODATA_CLASS, :] = 0
+        classified[:, NODATA_CLASS] = 0
+        total = classified.sum()
+        if total == 0:
+            continue
+
+        for before_cls, after_cls in zip(*np.nonzero(classified)):
+            count = classified[before_cls, after_cls]
+            results.append({
+                'Region_Type': output_name,
+                'Region_Name': region_name,
+                'From_Class': before_cls,
+                'From_Crop': class_name(before_cls),
+                'To_Class': after_cls,
+                'To_Crop': class_name(after_cls),
+                'Area_ha': count * pixel_area_ha,
+                'Pixel_Count': count,
+                'Percentage': (count / total) * 100
+            })
+
+    return pd.DataFrame(results, columns=TRANSITION_COLUMNS)
+
+def zone_transitions(transition_path, districts, taluks, district_column='DISTRICT', taluk_column='TALUK'):
+    """Per-district and per-taluk transition tables from a transition-code raster
+
+    The transition codes are single-band uint8 classes, so stage 04's
+    hierarchical_zone_counts counts them per taluk and rolls taluks (plus
+    district pixels outside every taluk) up to districts. Returns
+    {'District': frame, 'Taluk': frame}.
+    """
+
+    analysis = importlib.import_module('04_district_analysis')
+    print("📊 Calculating transition tables for Taluk (rolled up to District)...")
+
+    district_counts, taluk_counts, pixel_area_ha = analysis.hierarchical_zone_counts(
+        transition_path, districts, taluks, district_column
+    )
+
+    def matrices(zone_counts):
+        return zone_counts[1:, :N_CLASSES * N_CLASSES].reshape(-1, N_CLASSES, N_CLASSES)
+
+    return {
+        'District': _transitions_to_frame(matrices(district_counts), districts[district_column],
+                                          'District', pixel_area_ha),
+        'Taluk': _transitions_to_frame(matrices(taluk_counts), taluks[taluk_column], 'Taluk', pixel_area_ha)
+    }
+
+def detect_changes(before_path=CHANGE_BASELINE_PATH, after_path=PREDICTION_PATH, output_dir=CHANGE_DIR,
+                   boundaries=None):
+    """Compare two season predictions and write the change outputs
+
+    Writes the transition-code raster, a code legend, the area transition
+    matrix and, when boundaries are available, per-district and per-taluk
+    transition tables to ``output_dir``. Returns the transition matrix
+    frame.
+    """
+
+    raster_path = os.path.join(output_dir, 'transition_codes.tif')
+    matrix, pixel_area_ha = create_transition_raster(before_path, after_path, raster_path)
+
+    legend = pd.DataFrame([
+        {'Code': before_cls * N_CLASSES + after_cls,
+         'From_Class': before_cls, 'From_Crop': class_name(before_cls),
+         'To_Class': after_cls, 'To_Crop': class_name(after_cls)}
+        for before_cls in range(N_CLASSES) for after_cls in range(N_CLASSES)
+    ])
+    legend.to_csv(os.path.join(output_dir, 'transition_codes.csv'), index=False)
+
+    matrix_frame = transition_matrix_frame(matrix, pixel_area_ha)
+    matrix_frame.to_csv(os.path.join(output_dir, 'transition_matrix_ha.csv'))
+
+    if boundaries is None:
+        boundaries = importlib.import_module('04_district_analysis').load_administrative_data()
+    districts, taluks = boundaries
+    if districts is not None:
+        tables = zone_transitions(raster_path, districts, taluks)
+        tables['District'].to_csv(os.path.join(output_dir, 'districtwise_transitions.csv'), index=False)
+        tables['Taluk'].to_csv(os.path.join(output_dir, 'talukwise_transitions.csv'), index=False)
+    else:
+        print("⚠️ No shapefiles available - skipping per-zone transition tables")
+
+    # Summarize the largest changes between pixels classified in both
+    classified = matrix.copy()
+    classified[NODATA_CLASS, :] = 0
+    classified[:, NODATA_CLASS] = 0
+    changes = classified.copy()
+    np.fill_diagonal(changes, 0)
+    print("📈 Change Summary:")
+    print(f"  Unchanged: {np.trace(classified):,} pixels, changed: {changes.sum():,} pixels "
+          f"of {classified.sum():,} classified in both")
+    for flat in np.argsort(changes, axis=None)[::-1][:5]:
+        before_cls, after_cls = divmod(int(flat), N_CLASSES)
+        if changes[before_cls, after_cls] == 0:
+            break
+        print(f"  {class_name(before_cls)} → {class_name(after_cls)}: "
+              f"{changes[before_cls, after_cls] * pixel_area_ha:,.1f} ha")
+
+    print(f"💾 Change reports saved in: {output_dir}")
+    return matrix_frame
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect crop change between two prediction maps")
+    parser.add_argument('--before', default=CHANGE_BASELINE_PATH, help="Earlier season's prediction raster")
+    parser.add_argument('--after', default=PREDICTION_PATH, help="Later season's prediction raster")
+    parser.add_argument('--output-dir', default=CHANGE_DIR, help="Directory for change outputs")
+    args = parser.parse_args()
+
+    if args.before is None:
+        parser.error("--before is required when CHANGE_BASELINE_PATH is not configured")
+    detect_changes(args.before, args.after, args.output_dir)
@@ -0,0 +1,176 @@
+# batch_predict.py
+import argparse
+import csv
+import glob
+import importlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import *
+from model_registry import load_model
+
+DONE_NAME = 'done.json'
+SUMMARY_FIELDS = ['scene_id', 'ndvi_path', 'status', 'wall_s', 'prediction_path', 'reports_dir']
+
+
+def load_scenes(sources):
+    """Collect (scene_id, ndvi_path) pairs from manifests and glob patterns
+
+    A ``.csv`` manifest needs an ``ndvi_path`` column and may give a
+    ``scene_id`` (default: the file name without extension); relative
+    paths are taken from the manifest's directory. Anything else is a glob
+    pattern.
+    """
+    scenes = []
+    for source in sources:
+        if source.endswith('.csv'):
+            base = os.path.dirname(os.path.abspath(source))
+            with open(source, newline='') as f:
+                for row in csv.DictReader(f):
+                    path = os.path.join(base, row['ndvi_path'])
+                    scene_id = row.get('scene_id') or os.path.splitext(os.path.basename(path))[0]
+                    scenes.append((scene_id, path))
+        else:
+            for path in sorted(glob.glob(source)):
+                scenes.append((os.path.splitext(os.path.basename(path))[0], path))
+
+    seen = set()
+    for scene_id, _ in scenes:
+        if scene_id in seen:
+            raise ValueError(f"Duplicate scene id: {scene_id}")
+        seen.add(scene_id)
+    return scenes
+
+
+def _input_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _finished(scene_dir, ndvi_path):
+    """Done marker of a scene that finished before with the same input file, else None
+
+    The marker only counts while the outputs it records are still there.
+    """
+    done_path = os.path.join(scene_dir, DONE_NAME)
+    if not os.path.exists(done_path):
+        return None
+    with open(done_path) as f:
+        done = json.load(f)
+    if done.get('input') != _input_signature(ndvi_path):
+        return None
+    if not os.path.exists(done.get('prediction_path', '')):
+        return None
+    reports_dir = done.get('reports_dir')
+    if reports_dir and not (os.path.isdir(reports_dir) and os.listdir(reports_dir)):
+        return None
+    return done
+
+
+def process_scene(scene_id, ndvi_path, model, output_dir, boundaries=None,
+                  cache_precision=PREDICTION_CACHE_PRECISION):
+    """Classify one scene and write its zonal reports
+
+    The done marker is written last (atomically), so a scene interrupted
+    at any point is processed again on the next run.
+    """
+    prediction = importlib.import_module('03_prediction_mapping')
+    analysis = importlib.import_module('04_district_analysis')
+
+    scene_dir = os.path.join(output_dir, scene_id)
+    prediction_path = os.path.join(scene_dir, 'prediction.tif')
+    reports_dir = os.path.join(scene_dir, 'reports')
+
+    start = time.perf_counter()
+    prediction.create_prediction_map(workers=1, model=model, ndvi_path=ndvi_path, output_path=prediction_path,
+                                     cache_precision=cache_precision)
+    if boundaries is not None:
+        analysis.generate_reports(prediction_path, reports_dir=reports_dir, boundaries=boundaries)
+    wall = round(time.perf_counter() - start, 3)
+
+    done_path = os.path.join(scene_dir, DONE_NAME)
+    with open(done_path + '.tmp', 'w') as f:
+        json.dump({'scene_id': scene_id, 'ndvi_path': ndvi_path, 'input': _input_signature(ndvi_path),
+                   'wall_s': wall, 'prediction_path': prediction_path,
+                   'reports_dir': reports_dir if boundaries is not None else ''}, f, indent=2)
+    os.replace(done_path + '.tmp', done_path)
+
+    return {'scene_id': scene_id, 'ndvi_path': ndvi_path, 'status': 'done', 'wall_s': wall,
+            'prediction_path': prediction_path, 'reports_dir': reports_dir if boundaries is not None else ''}
+
+
+def run_batch(sources, workers=BATCH_WORKERS, output_dir=BATCH_DIR,
+              reports=True, resume=True, cache_precision=PREDICTION_CACHE_PRECISION):
+    """Classify many scenes with one resident model
+
+    Scenes run on a bounded thread pool that shares one loaded model and
+    one copy of the boundaries; raster I/O and the forest release the GIL,
+    so one scene's reads and writes overlap another scene's prediction.
+    Each scene writes ``<output_dir>/<scene_id>/prediction.tif`` and its
+    reports. With ``resume`` scenes whose done marker matches their input
+    file are skipped. A batch_summary.csv lists every scene's outcome.
+    With ``cache_precision`` all scenes share one prediction memo cache, so
+    band vectors seen in one scene are not classified again in the next.
+    """
+    scenes = load_scenes(sources)
+    print(f"🗂️ Batch of {len(scenes)} scene(s), {workers} worker(s)")
+
+    model = load_model()
+    boundaries = None
+    if reports:
+        analysis = importlib.import_module('04_district_analysis')
+        boundaries = analysis.load_administrative_data()
+        if boundaries[0] is None:
+            boundaries = None
+
+    results = []
+    pending = []
+    for scene_id, ndvi_path in scenes:
+        done = _finished(os.path.join(output_dir, scene_id), ndvi_path) if resume else None
+        if done is not None:
+            print(f"⏭️ {scene_id} already done")
+            results.append({**done, 'status': 'skipped'})
+        else:
+            pending.append((scene_id, ndvi_path))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(process_scene, scene_id, ndvi_path, model, output_dir, boundaries,
+                               cache_precision): scene_id
+                   for scene_id, ndvi_path in pending}
+        for future in as_completed(futures):
+            scene_id = futures[future]
+            try:
+                result = future.result()
+                print(f"✅ {scene_id} done in {result['wall_s']:.1f} s")
+            except Exception as e:
+                print(f"❌ {scene_id} failed: {e}")
+                result = {'scene_id': scene_id, 'status': f'failed: {e}'}
+            results.append(result)
+
+    os.makedirs(output_dir, exist_ok=True)
+    summary_path = os.path.join(output_dir, 'batch_summary.csv')
+    order = {scene_id: i for i, (scene_id, _) in enumerate(scenes)}
+    with open(summary_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(sorted(results, key=lambda r: order[r['scene_id']]))
+
+    failed = sum(1 for r in results if r['status'].startswith('failed'))
+    print(f"💾 Batch summary saved: {summary_path} ({len(results) - failed} ok, {failed} failed)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify many NDVI scenes with one loaded model")
+    parser.add_argument('sources', nargs='+', help="Scene manifest (.csv) or glob pattern(s)")
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help="Scenes processed concurrently")
+    parser.add_argument('--output-dir', default=BATCH_DIR, help="Directory for per-scene outputs")
+    parser.add_argument('--no-reports', action='store_true', help="Skip the per-scene zonal reports")
+    parser.add_argument('--no-resume', action='store_true', help="Reprocess scenes that are already done")
+    parser.add_argument('--cache-precision', type=float, default=PREDICTION_CACHE_PRECISION,
+                        help="NDVI step of the shared prediction memo cache (omit to classify every pixel)")
+    args = parser.parse_args()
+
+    run_batch(args.sources, workers=args.workers, output_dir=args.output_dir,
+              reports=not args.no_reports, resume=not args.no_resume, cache_precision=args.cache_precision)
@@ -0,0 +1,58 @@
+# benchmarks/bench_features.py
+import sys
+import os
+# Ensure project root is on sys.path for imports
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from ndvi_features import build_features, feature_columns
+
+def pandas_features(bands):
+    """Feature path used before the shared kernel (kept for comparison)"""
+    df = pd.DataFrame(bands.T, columns=[f"NDVI_Band_{i+1}" for i in range(bands.shape[0])])
+    band_cols = list(df.columns)
+    df['NDVI_Mean'] = df[band_cols].mean(axis=1)
+    df['NDVI_Std'] = df[band_cols].std(axis=1)
+    df['NDVI_Range'] = df[band_cols].max(axis=1) - df[band_cols].min(axis=1)
+    return df
+
+def run_benchmark(size, n_bands, repeat):
+    """Time the pandas path against build_features on a size x size raster"""
+    
+    print(f"⏱️ Feature benchmark: {size}x{size} pixels, {n_bands} bands")
+    
+    rng = np.random.default_rng(42)
+    bands = rng.uniform(-1, 1, size=(n_bands, size * size)).astype(np.float32)
+    
+    timings = {}
+    for name, func in [('pandas', pandas_features), ('kernel', build_features)]:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func(bands)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        print(f"   {name}: {best:.3f} s ({size * size / best / 1e6:.1f} Mpx/s)")
+    
+    # Both paths must produce the same features
+    expected = pandas_features(bands[:, :100000])[feature_columns(n_bands)].to_numpy()
+    actual = build_features(bands[:, :100000]).T
+    np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-6)
+    
+    print(f"🚀 Speedup: {timings['pandas'] / timings['kernel']:.1f}x")
+    return timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark NDVI feature construction")
+    parser.add_argument('--size', type=int, default=10000, help="Raster side length in pixels")
+    parser.add_argument('--bands', type=int, default=3, help="Number of NDVI bands")
+    parser.add_argument('--repeat', type=int, default=1, help="Repetitions per implementation")
+    args = parser.parse_args()
+    
+    run_benchmark(args.size, args.bands, args.repeat)
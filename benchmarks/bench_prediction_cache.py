@@ -0,0 +1,92 @@
+# benchmarks/bench_prediction_cache.py
+import sys
+import os
+# Ensure project root is on sys.path for imports
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import argparse
+import importlib
+import tempfile
+import time
+import joblib
+import numpy as np
+import rasterio
+from config import *
+from prediction_cache import PredictionCache, format_stats
+from raster_io import band_decoding, iter_windows
+from synthetic_data import synthetic_model, write_synthetic_ndvi
+
+DEFAULT_PRECISIONS = [1e-4, 1e-3, 1e-2]
+
+def _classify(path, model, window_size, cache=None):
+    """Classify a scene window by window; (seconds, class map)"""
+    prediction = importlib.import_module('03_prediction_mapping')
+    with rasterio.open(path) as src:
+        classes = np.empty((src.height, src.width), dtype=np.uint8)
+        start = time.perf_counter()
+        for window in iter_windows(src, window_size):
+            block = prediction.predict_block(model, src.read(window=window), src.nodata,
+                                             None, *band_decoding(src), cache=cache)
+            classes[window.row_off:window.row_off + window.height,
+                    window.col_off:window.col_off + window.width] = block
+        return time.perf_counter() - start, classes
+
+def run_benchmark(scenes, model, precisions, window_size, cache_size):
+    """Uncached vs cached prediction of each scene, one shared cache per precision"""
+
+    baseline = {}
+    for path in scenes:
+        seconds, classes = _classify(path, model, window_size)
+        baseline[path] = (seconds, classes)
+        print(f"   {os.path.basename(path)}: uncached {seconds:.2f} s")
+
+    for precision in precisions:
+        # One cache for all scenes, as in a batch run
+        cache = PredictionCache(precision, cache_size)
+        cache.bind('benchmark')
+        print(f"🧠 Cache step {precision:g}:")
+        for path in scenes:
+            seconds, classes = _classify(path, model, window_size, cache)
+            base_seconds, base_classes = baseline[path]
+            valid = base_classes != NODATA_CLASS
+            agreement = np.mean(classes[valid] == base_classes[valid])
+            print(f"   {os.path.basename(path)}: {seconds:.2f} s ({base_seconds / seconds:.1f}x), "
+                  f"agreement {agreement:.4%}")
+            print(f"      {format_stats(cache.take_stats())}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the prediction memo cache")
+    parser.add_argument('scenes', nargs='*',
+                        help="NDVI scenes, in processing order (default: the configured scene "
+                             "if present, else two synthetic int16 scenes and one float32 scene)")
+    parser.add_argument('--size', type=int, default=1000, help="Side length of synthetic scenes")
+    parser.add_argument('--precisions', type=float, nargs='+', default=DEFAULT_PRECISIONS,
+                        help="Cache steps (NDVI units) to compare")
+    parser.add_argument('--window-size', type=int, default=PREDICTION_WINDOW_SIZE,
+                        help="Prediction window size in pixels (0 = the whole raster as one window)")
+    parser.add_argument('--cache-size', type=int, default=PREDICTION_CACHE_SIZE,
+                        help="Entries kept by the cache")
+    parser.add_argument('--model', default=MODEL_PATH, help="Trained model (synthetic forest if missing)")
+    args = parser.parse_args()
+
+    # Single-threaded so the speedup is per core
+    if os.path.exists(args.model):
+        model = joblib.load(args.model)
+        print(f"🤖 Using model: {args.model}")
+    else:
+        model = synthetic_model(3)
+        print("🤖 Using a synthetic forest")
+    model.n_jobs = 1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scenes = args.scenes or ([NDVI_2024_PATH] if os.path.exists(NDVI_2024_PATH) else [])
+        if not scenes:
+            # int16 scenes are lossless at step 1e-4; the float32 one shows what rounding costs
+            scenes = [write_synthetic_ndvi(os.path.join(tmp_dir, f"scene_{seed}_{dtype}.tif"), args.size,
+                                           nodata_fraction=0.1, seed=seed, dtype=dtype)
+                      for seed, dtype in ((1, 'int16'), (2, 'int16'), (3, 'float32'))]
+        print(f"⏱️ Prediction cache benchmark: {len(scenes)} scene(s)")
+        run_benchmark(scenes, model, args.precisions, args.window_size or None, args.cache_size)
@@ -0,0 +1,140 @@
+# benchmarks/bench_quantized.py
+import sys
+import os
+# Ensure project root is on sys.path for imports
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import argparse
+import gc
+import importlib
+import tempfile
+import time
+import joblib
+import numpy as np
+import rasterio
+from sklearn.ensemble import RandomForestClassifier
+from config import *
+from ndvi_features import build_features
+from profiling import _peak_rss_mb, _reset_peak_rss
+from raster_io import band_decoding, iter_windows, write_quantized_ndvi
+from synthetic_data import synthetic_model, write_synthetic_ndvi
+
+def _feature_pass(path):
+    """Read the whole raster and build its features; (seconds, peak RSS increase MB)"""
+    gc.collect()
+    reset = _reset_peak_rss()
+    before = _peak_rss_mb()
+    start = time.perf_counter()
+    with rasterio.open(path) as src:
+        bands = src.read()
+        features = build_features(bands.reshape(src.count, -1), *band_decoding(src))
+    elapsed = time.perf_counter() - start
+    peak = _peak_rss_mb() - before if reset else None
+    del bands, features
+    return elapsed, peak
+
+def _predict(path, model, window_size):
+    """Classify the raster window by window; (seconds, class map)"""
+    prediction = importlib.import_module('03_prediction_mapping')
+    with rasterio.open(path) as src:
+        classes = np.empty((src.height, src.width), dtype=np.uint8)
+        start = time.perf_counter()
+        for window in iter_windows(src, window_size):
+            block = prediction.predict_block(model, src.read(window=window), src.nodata,
+                                             None, *band_decoding(src))
+            classes[window.row_off:window.row_off + window.height,
+                    window.col_off:window.col_off + window.width] = block
+        return time.perf_counter() - start, classes
+
+def _accuracy_parity(paths, n_train=20000, n_test=50000):
+    """Test accuracy of forests trained on each encoding of the same pixels
+
+    Labels are the quartile of each pixel's mean NDVI with 10% of them
+    shuffled, so there is a real signal to learn. Both forests see the
+    same training and test pixels; only the encoding differs.
+    """
+    rng = np.random.default_rng(RANDOM_STATE)
+    features = {}
+    for name, path in paths.items():
+        with rasterio.open(path) as src:
+            bands = src.read().reshape(src.count, -1)
+            if name == 'float32':
+                pixels = np.flatnonzero(np.isfinite(bands).all(axis=0))
+                pixels = rng.choice(pixels, size=min(pixels.size, n_train + n_test), replace=False)
+            features[name] = build_features(bands[:, pixels], *band_decoding(src)).T
+
+    mean = features['float32'][:, -3]
+    labels = np.digitize(mean, np.quantile(mean, [0.25, 0.5, 0.75])) + 1
+    noisy = rng.random(labels.size) < 0.1
+    labels[noisy] = rng.permutation(labels[noisy])
+
+    accuracy = {}
+    for name, X in features.items():
+        model = RandomForestClassifier(n_estimators=N_ESTIMATORS, random_state=RANDOM_STATE,
+                                       max_depth=10, min_samples_split=5, n_jobs=-1)
+        model.fit(X[:n_train], labels[:n_train])
+        accuracy[name] = model.score(X[n_train:], labels[n_train:])
+    return accuracy
+
+def run_benchmark(size, n_bands, nodata_fraction, window_size, model_path=None):
+    """Compare the float32 and int16 NDVI paths on one synthetic scene"""
+
+    # Single-threaded so throughput is per core
+    if model_path and os.path.exists(model_path):
+        model = joblib.load(model_path)
+        print(f"🤖 Using model: {model_path}")
+    else:
+        model = synthetic_model(n_bands)
+        print("🤖 Using a synthetic forest")
+    model.n_jobs = 1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {
+            'float32': os.path.join(tmp_dir, 'ndvi_float32.tif'),
+            'int16': os.path.join(tmp_dir, 'ndvi_int16.tif')
+        }
+        write_synthetic_ndvi(paths['float32'], size, n_bands=n_bands, nodata_fraction=nodata_fraction)
+        write_quantized_ndvi(paths['float32'], paths['int16'])
+
+        print(f"⏱️ Quantized NDVI benchmark: {size}x{size} pixels, {n_bands} bands, "
+              f"{nodata_fraction:.0%} nodata")
+        results = {}
+        for name, path in paths.items():
+            feature_s, feature_peak = _feature_pass(path)
+            predict_s, classes = _predict(path, model, window_size)
+            results[name] = {'classes': classes}
+            peak_text = f"{feature_peak:,.0f} MB" if feature_peak is not None else "n/a"
+            print(f"   {name}: file {os.path.getsize(path) / 1024 ** 2:,.1f} MB, "
+                  f"read+features {feature_s:.2f} s ({size * size / feature_s / 1e6:.1f} Mpx/s, "
+                  f"peak +{peak_text}), predict {predict_s:.2f} s "
+                  f"({size * size / predict_s / 1e6:.2f} Mpx/s)")
+
+        accuracy = _accuracy_parity(paths)
+
+    # Parity: the same model must classify both encodings alike
+    float_classes = results['float32']['classes']
+    int_classes = results['int16']['classes']
+    valid = float_classes != NODATA_CLASS
+    if not np.array_equal(valid, int_classes != NODATA_CLASS):
+        print("❌ Nodata masks differ between the encodings")
+    agreement = np.count_nonzero(float_classes[valid] == int_classes[valid]) / max(1, np.count_nonzero(valid))
+    print(f"🎯 Class agreement on {np.count_nonzero(valid):,} valid pixels: {agreement:.4%}")
+    print(f"🎯 Test accuracy trained on float32: {accuracy['float32']:.4f}, "
+          f"on int16: {accuracy['int16']:.4f}")
+    return agreement, accuracy
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the compact int16 NDVI path against float32")
+    parser.add_argument('--size', type=int, default=2000, help="Raster side length in pixels")
+    parser.add_argument('--bands', type=int, default=3, help="Number of NDVI bands")
+    parser.add_argument('--nodata-fraction', type=float, default=0.1,
+                        help="Fraction of the raster covered by nodata holes")
+    parser.add_argument('--window-size', type=int, default=PREDICTION_WINDOW_SIZE,
+                        help="Prediction window size in pixels (0 = the whole raster as one window)")
+    parser.add_argument('--model', default=MODEL_PATH, help="Trained model (synthetic forest if missing)")
+    args = parser.parse_args()
+
+    run_benchmark(args.size, args.bands, args.nodata_fraction, args.window_size or None, args.model)
@@ -0,0 +1,141 @@
+# benchmarks/load_test_service.py
+import sys
+import os
+# Ensure project root is on sys.path for imports
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+import numpy as np
+import rasterio
+from rasterio.warp import transform_bounds
+import config
+
+ENDPOINTS = ('classify', 'point', 'bbox')
+
+
+async def request(reader, writer, host, path):
+    """One GET over a keep-alive connection; returns (status, JSON body)"""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+def _query(endpoint, bounds, rng):
+    left, bottom, right, top = bounds
+    lon, lat = rng.uniform(left, right), rng.uniform(bottom, top)
+    if endpoint == 'bbox':
+        # Boxes of up to a tenth of the scene's extent
+        width, height = rng.uniform(0, (right - left) / 10), rng.uniform(0, (top - bottom) / 10)
+        return (f"/bbox?min_lon={lon}&min_lat={lat}"
+                f"&max_lon={min(lon + width, right)}&max_lat={min(lat + height, top)}")
+    return f"/{endpoint}?lon={lon}&lat={lat}"
+
+
+async def client(host, port, endpoint, bounds, n_requests, seed, latencies, failures):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(n_requests):
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, host, _query(endpoint, bounds, rng))
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                failures.append(status)
+    finally:
+        writer.close()
+
+
+async def load_test(host, port, endpoint, bounds, concurrency, n_requests):
+    """Run ``concurrency`` keep-alive clients sending ``n_requests`` each"""
+    latencies, failures = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, endpoint, bounds, n_requests, i, latencies, failures)
+                           for i in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, metrics = await request(reader, writer, host, '/metrics')
+    writer.close()
+
+    ms = np.array(latencies) * 1000
+    return {
+        'endpoint': endpoint, 'concurrency': concurrency, 'requests': len(latencies),
+        'failures': len(failures), 'wall_s': round(wall, 3),
+        'throughput_per_s': round(len(latencies) / wall, 1),
+        'p50_ms': round(float(np.percentile(ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(ms, 95)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+        'service': metrics
+    }
+
+
+async def wait_for_service(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+
+def main(args):
+    with rasterio.open(args.prediction) as src:
+        bounds = transform_bounds(src.crs, 'EPSG:4326', *src.bounds) if src.crs else src.bounds
+
+    service = None
+    if args.start_service:
+        service = subprocess.Popen([sys.executable, os.path.join(PROJECT_ROOT, 'query_service.py'),
+                                    '--host', args.host, '--port', str(args.port),
+                                    '--prediction', args.prediction])
+    try:
+        asyncio.run(wait_for_service(args.host, args.port, timeout=120))
+        print(f"🚀 Load test against http://{args.host}:{args.port}")
+        for concurrency in args.concurrency:
+            result = asyncio.run(load_test(args.host, args.port, args.endpoint, bounds,
+                                           concurrency, args.requests))
+            service_metrics = result['service']
+            print(f"   /{args.endpoint} x{concurrency}: {result['throughput_per_s']:,.0f} req/s, "
+                  f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+                  f"p99 {result['p99_ms']:.1f} ms, {result['failures']} failed"
+                  + (f", mean batch {service_metrics['mean_batch_size']}"
+                     if args.endpoint == 'classify' else ''))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the local query service")
+    parser.add_argument('--host', default=config.QUERY_HOST)
+    parser.add_argument('--port', type=int, default=config.QUERY_PORT)
+    parser.add_argument('--endpoint', choices=ENDPOINTS, default='classify')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 64],
+                        help="Concurrent keep-alive clients, one run per value")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per client")
+    parser.add_argument('--prediction', default=config.PREDICTION_PATH,
+                        help="Prediction raster whose extent queries are drawn from")
+    parser.add_argument('--start-service', action='store_true',
+                        help="Start query_service.py for the duration of the test")
+    main(parser.parse_args())
@@ -0,0 +1,136 @@
+# benchmarks/run_benchmarks.py
+import sys
+import os
+# Ensure project root is on sys.path for imports
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import argparse
+import glob
+import json
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime
+import config
+from synthetic_data import write_synthetic_boundaries, write_synthetic_ndvi
+
+RESULTS_DIR = os.path.join(CURRENT_DIR, 'results')
+DEFAULT_SIZES = [1000, 2000, 5000, 10000, 20000]
+
+def _workspace_path(workspace, path):
+    """Map a config path into a benchmark workspace"""
+    return os.path.join(workspace, os.path.relpath(path, config.BASE_DIR))
+
+def _git_sha():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def run_size(size, n_bands, nodata_fraction, keep=False, dtype='float32'):
+    """Run the full pipeline on a synthetic size x size scene
+
+    Every size gets its own workspace (data, models, outputs) through
+    CROP_PIPELINE_HOME, so runs never share cached stages or outputs. The
+    pipeline runs in a fresh process and its run report is returned.
+    """
+    workspace = tempfile.mkdtemp(prefix=f"crop_bench_{size}_")
+    ndvi_path = _workspace_path(workspace, config.NDVI_2024_PATH)
+
+    print(f"\n📐 {size:,} x {size:,} pixels, {n_bands} {dtype} bands, {nodata_fraction:.0%} nodata")
+    write_synthetic_ndvi(ndvi_path, size, n_bands=n_bands, nodata_fraction=nodata_fraction, dtype=dtype)
+    write_synthetic_boundaries(ndvi_path,
+                               _workspace_path(workspace, config.DISTRICTS_SHP),
+                               _workspace_path(workspace, config.TALUKS_SHP))
+
+    env = dict(os.environ, CROP_PIPELINE_HOME=workspace, MPLBACKEND='Agg')
+    log_path = os.path.join(workspace, 'pipeline.log')
+    with open(log_path, 'w') as log:
+        completed = subprocess.run([sys.executable, os.path.join(PROJECT_ROOT, 'run_pipeline.py'), '--no-cache'],
+                                   cwd=workspace, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    report_dir = os.path.join(_workspace_path(workspace, config.OUTPUT_DIR), 'reports')
+    reports = sorted(glob.glob(os.path.join(report_dir, 'run_report_*.json')))
+    if not reports:
+        print(f"❌ No run report produced (exit code {completed.returncode}), see {log_path}")
+        return {'size': size, 'bands': n_bands, 'dtype': dtype, 'nodata_fraction': nodata_fraction,
+                'returncode': completed.returncode, 'stages': []}
+    with open(reports[-1]) as f:
+        report = json.load(f)
+
+    for record in report['stages']:
+        status = "ok" if record['success'] else "failed"
+        peak = record['peak_rss_mb']
+        peak_text = f"{peak:,.0f} MB" if peak is not None else "n/a"
+        print(f"   {record['stage']}: {record['wall_s']:.2f} s wall, {record['cpu_s']:.2f} s CPU, "
+              f"peak {peak_text} ({status})")
+
+    if keep:
+        print(f"📁 Workspace kept: {workspace}")
+    else:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    return {'size': size, 'bands': n_bands, 'dtype': dtype, 'nodata_fraction': nodata_fraction,
+            'returncode': completed.returncode, 'stages': report['stages']}
+
+def compare(old_path, new_results):
+    """Print per-stage wall time and peak memory changes against an older result file"""
+    with open(old_path) as f:
+        old = json.load(f)
+    old_runs = {run['size']: run for run in old['runs']}
+
+    print(f"\n📊 COMPARISON WITH {old.get('git_sha', '?')} ({os.path.basename(old_path)})")
+    for run in new_results['runs']:
+        old_run = old_runs.get(run['size'])
+        if old_run is None:
+            continue
+        old_stages = {record['stage']: record for record in old_run['stages']}
+        print(f"   {run['size']:,} px:")
+        for record in run['stages']:
+            before = old_stages.get(record['stage'])
+            if before is None:
+                continue
+            change = (record['wall_s'] - before['wall_s']) / before['wall_s'] * 100 if before['wall_s'] else 0.0
+            line = f"      {record['stage']}: {before['wall_s']:.2f} s -> {record['wall_s']:.2f} s ({change:+.1f}%)"
+            if record['peak_rss_mb'] is not None and before['peak_rss_mb'] is not None:
+                line += f", peak {before['peak_rss_mb']:,.0f} -> {record['peak_rss_mb']:,.0f} MB"
+            print(line)
+
+def run_benchmarks(sizes, n_bands, nodata_fraction, keep=False, dtype='float32'):
+    """Benchmark every stage at each size and save the results"""
+    results = {
+        'git_sha': _git_sha(),
+        'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S'),
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+        'runs': [run_size(size, n_bands, nodata_fraction, keep, dtype) for size in sizes]
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{results['timestamp']}_{results['git_sha']}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Benchmark results saved: {path}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic scenes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Raster side lengths in pixels")
+    parser.add_argument('--bands', type=int, default=3, help="NDVI bands per scene")
+    parser.add_argument('--nodata-fraction', type=float, default=0.1,
+                        help="Fraction of the raster covered by nodata holes")
+    parser.add_argument('--dtype', choices=['float32', 'int16'], default='float32',
+                        help="NDVI storage of the synthetic scenes")
+    parser.add_argument('--compare', metavar='RESULTS_JSON',
+                        help="Earlier results file to compare against")
+    parser.add_argument('--keep', action='store_true', help="Keep the benchmark workspaces")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.bands, args.nodata_fraction, args.keep, args.dtype)
+    if args.compare:
+        compare(args.compare, results)
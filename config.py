@@ -1,35 +1,136 @@
-# config.py
-import os
-
-# Project paths
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, 'data')
-RAW_DATA_DIR = os.path.join(DATA_DIR, 'raw')
-PROCESSED_DATA_DIR = os.path.join(DATA_DIR, 'processed')
-BOUNDARIES_DIR = os.path.join(DATA_DIR, 'boundaries')
-OUTPUT_DIR = os.path.join(BASE_DIR, 'outputs')
-
-# File paths
-NDVI_2024_PATH = os.path.join(RAW_DATA_DIR, '2024_NDVI.tif')
-DISTRICTS_SHP = os.path.join(BOUNDARIES_DIR, 'karnataka_districts.shp')
-TALUKS_SHP = os.path.join(BOUNDARIES_DIR, 'karnataka_taluks.shp')
-
-# Model parameters
-RANDOM_STATE = 42
-N_ESTIMATORS = 100
-TEST_SIZE = 0.2
-
-# Map settings
-CROP_NAMES = {
-    1: "Paddy (Rice)",
-    2: "Ragi (Finger Millet)", 
-    3: "Groundnut / Maize",
-    4: "Fallow / Barren Land"
-}
-
-COLOR_MAP = {
-    1: '#1b9e77',  # Green
-    2: '#d95f02',  # Orange
-    3: '#7570b3',  # Purple
-    4: '#e7298a'   # Pink
+# config.py
+import os
+
+# Project paths
+# CROP_PIPELINE_HOME relocates data, models and outputs (used by the benchmarks)
+BASE_DIR = os.environ.get('CROP_PIPELINE_HOME', os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+RAW_DATA_DIR = os.path.join(DATA_DIR, 'raw')
+PROCESSED_DATA_DIR = os.path.join(DATA_DIR, 'processed')
+BOUNDARIES_DIR = os.path.join(DATA_DIR, 'boundaries')
+OUTPUT_DIR = os.path.join(BASE_DIR, 'outputs')
+MODELS_DIR = os.path.join(BASE_DIR, 'models')
+
+# File paths
+NDVI_2024_PATH = os.path.join(RAW_DATA_DIR, '2024_NDVI.tif')
+DISTRICTS_SHP = os.path.join(BOUNDARIES_DIR, 'karnataka_districts.shp')
+TALUKS_SHP = os.path.join(BOUNDARIES_DIR, 'karnataka_taluks.shp')
+TRAINING_STORE_DIR = os.path.join(PROCESSED_DATA_DIR, 'training_data')
+TRAINING_CSV_PATH = os.path.join(PROCESSED_DATA_DIR, 'training_data.csv')
+MODEL_PATH = os.path.join(MODELS_DIR, 'crop_classifier.pkl')
+PREDICTION_PATH = os.path.join(OUTPUT_DIR, 'predictions', 'tumkur_2025_prediction.tif')
+
+# NDVI storage written by the project: 'float32' or 'int16' (NDVI * 10000,
+# -32768 = nodata, band scale 1e-4). Readers accept either, whatever this says.
+NDVI_DTYPE = 'float32'
+
+# Model parameters
+RANDOM_STATE = 42
+N_ESTIMATORS = 100
+TEST_SIZE = 0.2
+
+# Training sample settings
+# Pixels kept per class by the stratified sampler (None keeps every pixel)
+SAMPLES_PER_CLASS = 50000
+SAMPLE_SEED = RANDOM_STATE
+# Window side (pixels) streamed while sampling; None = whole raster
+SAMPLING_WINDOW_SIZE = 1024
+# Also export the training data as CSV next to the columnar store
+EXPORT_TRAINING_CSV = False
+
+# Prediction settings
+# Side length (pixels) of the square windows streamed through the classifier.
+# Set to None to classify the whole raster in one go.
+PREDICTION_WINDOW_SIZE = 1024
+# Number of worker processes for tiled prediction (1 = in-process, 0 = all cores)
+PREDICTION_WORKERS = 1
+# Prediction memo cache: pixels whose bands agree at this NDVI step share one
+# prediction (1e-4 is lossless for int16 NDVI); None classifies every pixel
+PREDICTION_CACHE_PRECISION = None
+# Distinct band vectors remembered per process, across blocks and scenes (LRU)
+PREDICTION_CACHE_SIZE = 1_000_000
+# Class value written for nodata and masked pixels (also the output nodata tag)
+NODATA_CLASS = 0
+# Optional AOI polygons (any file geopandas reads); pixels outside are not classified
+PREDICTION_AOI_PATH = None
+# 'cog' = Cloud-Optimized GeoTIFF with internal overviews, 'gtiff' = plain tiled GeoTIFF
+PREDICTION_FORMAT = 'cog'
+# COG tile size (pixels) and compression ('ZSTD' or 'DEFLATE', both with a predictor)
+COG_BLOCK_SIZE = 512
+COG_COMPRESS = 'ZSTD'
+
+# Zonal statistics settings
+# Window side (pixels) used when counting pixels per zone; None = whole raster
+ZONAL_WINDOW_SIZE = 4096
+# 'label' = one label raster for all zones, 'windowed' = per-zone bounding-box reads
+ZONAL_STATS_MODE = 'label'
+# Threads used by the 'windowed' mode
+ZONAL_WORKERS = 4
+# Also write a state-level report rolled up from the district statistics
+REPORT_STATE_LEVEL = True
+STATE_NAME = 'Karnataka'
+
+# Change detection settings
+# Earlier season's prediction raster compared with PREDICTION_PATH (None skips stage 07)
+CHANGE_BASELINE_PATH = None
+CHANGE_DIR = os.path.join(OUTPUT_DIR, 'change')
+CHANGE_WINDOW_SIZE = 4096
+
+# Map atlas settings
+ATLAS_DIR = os.path.join(OUTPUT_DIR, 'maps', 'atlas')
+# Also render a per-unit atlas in the pipeline: None, 'district' or 'taluk'
+ATLAS_LEVEL = None
+# Worker processes for atlas rendering (0 = all cores)
+ATLAS_WORKERS = 0
+# Largest side (pixels) of each atlas map image
+ATLAS_MAP_SIZE = 1200
+
+# Dashboard tile pyramid settings
+TILES_DIR = os.path.join(OUTPUT_DIR, 'maps', 'tiles')
+TILE_MIN_ZOOM = 8
+# None = native resolution of the prediction raster
+TILE_MAX_ZOOM = None
+# Worker processes for tile rendering (0 = all cores)
+TILE_WORKERS = 0
+
+# Dashboard vector layer settings
+VECTOR_DIR = os.path.join(OUTPUT_DIR, 'maps', 'vectors')
+# Zoom levels that get their own simplified boundary layer
+VECTOR_ZOOMS = (6, 8, 10, 12)
+# Simplification tolerance in screen pixels at each zoom
+VECTOR_SIMPLIFY_PIXELS = 0.5
+# Initial zoom of the interactive map
+DASHBOARD_ZOOM = 10
+
+# Batch processing settings
+BATCH_DIR = os.path.join(OUTPUT_DIR, 'batch')
+# Scenes processed concurrently by threads sharing one loaded model
+BATCH_WORKERS = 2
+
+# Query service settings
+QUERY_HOST = '127.0.0.1'
+QUERY_PORT = 8765
+# Concurrent /classify requests are gathered for up to this long...
+QUERY_BATCH_WAIT_MS = 2
+# ...or until this many points, then classified in one predict call
+QUERY_MAX_BATCH = 512
+
+# Stage cache settings
+STAGE_CACHE_DIR = os.path.join(BASE_DIR, '.stage_cache')
+# Least recently used stage results are evicted beyond this size
+STAGE_CACHE_MAX_BYTES = 5 * 1024 ** 3
+
+# Map settings
+CROP_NAMES = {
+    1: "Paddy (Rice)",
+    2: "Ragi (Finger Millet)", 
+    3: "Groundnut / Maize",
+    4: "Fallow / Barren Land"
+}
+
+COLOR_MAP = {
+    1: '#1b9e77',  # Green
+    2: '#d95f02',  # Orange
+    3: '#7570b3',  # Purple
+    4: '#e7298a'   # Pink
 }
\ No newline at end of file
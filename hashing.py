@@ -0,0 +1,14 @@
+# hashing.py
+import hashlib
+
+# Files are hashed in chunks of this many bytes, so memory stays flat
+CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,73 @@
+# model_registry.py
+import json
+import os
+import joblib
+from config import *
+from hashing import file_sha256
+from ndvi_features import count_bands
+
+MODEL_META_PATH = os.path.join(MODELS_DIR, 'model.json')
+
+# One loaded model per file and process: path -> (mtime, model)
+_MODEL_CACHE = {}
+
+
+def save_model(model, feature_columns):
+    """Store a trained forest plus its metadata
+
+    The metadata records feature columns, band count and a content hash of
+    the model.
+    """
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    joblib.dump(model, MODEL_PATH)
+
+    metadata = {
+        'feature_columns': list(feature_columns),
+        'n_bands': count_bands(feature_columns),
+        'classes': [int(c) for c in model.classes_],
+        'model_hash': file_sha256(MODEL_PATH)
+    }
+    with open(MODEL_META_PATH, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def load_metadata():
+    """Return the registry metadata, deriving it from the pickle if missing"""
+    if os.path.exists(MODEL_META_PATH):
+        with open(MODEL_META_PATH) as f:
+            return json.load(f)
+
+    model = load_model()
+    feature_columns = [str(c) for c in getattr(model, 'feature_names_in_', [])]
+    return {
+        'feature_columns': feature_columns,
+        'n_bands': count_bands(feature_columns) if feature_columns else model.n_features_in_ - 3,
+        'classes': [int(c) for c in model.classes_],
+        'model_hash': file_sha256(MODEL_PATH)
+    }
+
+
+def load_model():
+    """Load the classifier once per process, reloading it when the pickle changes
+
+    sklearn copies the tree nodes out of the pickle, so each process that
+    loads it holds its own copy. Processes forked after the parent called
+    load_model inherit the cached model instead and share its pages
+    copy-on-write.
+    """
+    mtime = os.path.getmtime(MODEL_PATH)
+    cached = _MODEL_CACHE.get(MODEL_PATH)
+    if cached is None or cached[0] != mtime:
+        cached = _MODEL_CACHE[MODEL_PATH] = (mtime, joblib.load(MODEL_PATH))
+    return cached[1]
+
+
+def check_raster(n_bands, metadata=None):
+    """Raise ValueError if a raster's band count does not match the model"""
+    metadata = metadata or load_metadata()
+    if n_bands != metadata['n_bands']:
+        raise ValueError(
+            f"Raster has {n_bands} bands but the model was trained on "
+            f"{metadata['n_bands']} ({', '.join(metadata['feature_columns'])})"
+        )
@@ -0,0 +1,117 @@
+# ndvi_features.py
+import numpy as np
+
+BAND_PREFIX = 'NDVI_Band_'
+DERIVED_FEATURES = ['NDVI_Mean', 'NDVI_Std', 'NDVI_Range']
+
+# Compact NDVI encoding: int16 = round(NDVI * INT16_SCALE), INT16_NODATA = missing
+INT16_SCALE = 10000
+INT16_NODATA = -32768
+
+
+def band_columns(n_bands):
+    """Column names of the raw NDVI bands"""
+    return [f"{BAND_PREFIX}{i+1}" for i in range(n_bands)]
+
+
+def feature_columns(n_bands):
+    """Column names produced by build_features, in order"""
+    return band_columns(n_bands) + DERIVED_FEATURES
+
+
+def count_bands(columns):
+    """Number of NDVI band columns in a list of column names"""
+    return sum(1 for c in columns if str(c).startswith(BAND_PREFIX))
+
+
+def quantize_ndvi(bands, nodata=None):
+    """Encode float NDVI as int16 (NDVI * INT16_SCALE, clipped to [-1, 1])
+
+    NaN/inf values and ``nodata`` become INT16_NODATA. Decode with
+    scale 1 / INT16_SCALE, which build_features applies itself.
+    """
+    bands = np.asarray(bands)
+    invalid = ~np.isfinite(bands)
+    if nodata is not None and not np.isnan(nodata):
+        invalid |= bands == nodata
+    encoded = np.rint(np.clip(np.where(invalid, 0, bands), -1.0, 1.0) * INT16_SCALE).astype(np.int16)
+    encoded[invalid] = INT16_NODATA
+    return encoded
+
+
+def build_features(bands, scale=1.0, offset=0.0):
+    """Build the model feature matrix from a (bands, pixels) NDVI array
+
+    Returns a float32 array of shape (bands + 3, pixels): the raw bands
+    followed by NDVI_Mean, NDVI_Std (sample std, ddof=1; 0 for a single
+    band) and NDVI_Range.
+    All derived features are accumulated in a single pass over the bands,
+    so any number of bands is supported without intermediate copies.
+    Training and inference both go through this function.
+
+    Integer bands (the int16 encoding) are accumulated exactly in integer
+    arithmetic and decoded as ``value * scale + offset`` (the raster's
+    band scale/offset) while the float32 features are written, so the
+    features are in NDVI units whatever the storage.
+    """
+    bands = np.asarray(bands)
+    if np.issubdtype(bands.dtype, np.integer):
+        return _build_features_int(bands, scale, offset)
+    bands = bands.astype(np.float32, copy=False)
+    if scale != 1.0 or offset != 0.0:
+        bands = bands * np.float32(scale) + np.float32(offset)
+    n_bands, n_pixels = bands.shape
+
+    features = np.empty((n_bands + len(DERIVED_FEATURES), n_pixels), dtype=np.float32)
+    total = np.zeros(n_pixels, dtype=np.float64)
+    total_sq = np.zeros(n_pixels, dtype=np.float64)
+    band_min = np.full(n_pixels, np.inf, dtype=np.float32)
+    band_max = np.full(n_pixels, -np.inf, dtype=np.float32)
+
+    for i in range(n_bands):
+        band = bands[i]
+        features[i] = band
+        total += band
+        total_sq += np.square(band, dtype=np.float64)
+        np.minimum(band_min, band, out=band_min)
+        np.maximum(band_max, band, out=band_max)
+
+    mean = total / n_bands
+    # A single band has no spread: its NDVI_Std is 0, not NaN
+    with np.errstate(invalid='ignore'):
+        variance = (total_sq - total * mean) / max(n_bands - 1, 1)
+    np.maximum(variance, 0, out=variance)
+
+    features[n_bands] = mean
+    features[n_bands + 1] = np.sqrt(variance)
+    features[n_bands + 2] = band_max - band_min
+    return features
+
+
+def _build_features_int(bands, scale, offset):
+    """build_features for integer-coded bands, without a float copy of the bands"""
+    n_bands, n_pixels = bands.shape
+
+    features = np.empty((n_bands + len(DERIVED_FEATURES), n_pixels), dtype=np.float32)
+    total = np.zeros(n_pixels, dtype=np.int64)
+    total_sq = np.zeros(n_pixels, dtype=np.int64)
+    band_min = bands[0].copy()
+    band_max = bands[0].copy()
+
+    for i in range(n_bands):
+        band = bands[i]
+        np.multiply(band, np.float32(scale), out=features[i])
+        if offset != 0.0:
+            features[i] += np.float32(offset)
+        total += band
+        total_sq += np.square(band, dtype=np.int64)
+        np.minimum(band_min, band, out=band_min)
+        np.maximum(band_max, band, out=band_max)
+
+    # n * sum(x^2) - sum(x)^2 is exact in integers (0 for a single band)
+    variance = (n_bands * total_sq - total * total) / (n_bands * max(n_bands - 1, 1))
+
+    features[n_bands] = total * (scale / n_bands) + offset
+    features[n_bands + 1] = np.sqrt(variance) * abs(scale)
+    features[n_bands + 2] = (band_max.astype(np.int32) - band_min) * abs(scale)
+    return features
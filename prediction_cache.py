@@ -0,0 +1,152 @@
+# prediction_cache.py
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import *
+
+# One cache per (precision, size) and process: kept across blocks and scenes
+_SHARED_CACHES = {}
+_SHARED_LOCK = threading.Lock()
+
+
+class PredictionCache:
+    """Bounded LRU memo of predicted classes keyed on quantized band vectors
+
+    Each pixel's NDVI bands are rounded to multiples of ``precision``
+    (clipped to the NDVI range [-1, 1]) and packed into one integer key.
+    Within a block the keys are deduplicated with np.unique, keys already
+    in the cache are answered from it and only the remaining distinct
+    vectors are classified, from their quantized values. Pixels sharing a
+    key therefore always get the same class, whichever block or scene
+    first produced it. With int16 NDVI and ``precision`` equal to its step
+    (1e-4) the quantization is lossless.
+
+    The cache keeps at most ``max_entries`` keys, evicting the least
+    recently used, and is cleared when bound to a different model hash.
+    It is safe to share between threads; hit/miss counters are kept per
+    thread, so each thread's take_stats() reports only its own lookups.
+    """
+
+    def __init__(self, precision=PREDICTION_CACHE_PRECISION, max_entries=PREDICTION_CACHE_SIZE):
+        if not precision or precision <= 0:
+            raise ValueError("Cache precision must be a positive NDVI step")
+        self.precision = precision
+        self.max_entries = max_entries
+        self.model_hash = None
+        self._levels = int(round(1.0 / precision))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def bind(self, model_hash):
+        """Use the cache for the model with ``model_hash``, clearing it on a change"""
+        with self._lock:
+            if model_hash != self.model_hash:
+                self._entries.clear()
+                self.model_hash = model_hash
+
+    def quantize(self, pixels, scale=1.0, offset=0.0):
+        """(bands, pixels) integer levels: round(NDVI / precision), clipped to [-1, 1]"""
+        ndvi = pixels * scale + offset if (scale != 1.0 or offset != 0.0) else pixels
+        levels = np.rint(np.asarray(ndvi, dtype=np.float64) / self.precision)
+        np.clip(levels, -self._levels, self._levels, out=levels)
+        return levels.astype(np.int64)
+
+    def _keys(self, levels):
+        """One hashable key per pixel: a packed int64, or raw bytes for many bands"""
+        base = 2 * self._levels + 1
+        if base ** levels.shape[0] < 2 ** 63:
+            keys = np.zeros(levels.shape[1], dtype=np.int64)
+            for band in levels[::-1]:
+                keys *= base
+                keys += band + self._levels
+            return keys
+        rows = np.ascontiguousarray(levels.T)
+        return rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+
+    def predict(self, pixels, predict_levels, scale=1.0, offset=0.0):
+        """Classes for (bands, pixels) NDVI through the cache
+
+        ``pixels`` are stored values decoded with ``scale``/``offset``.
+        ``predict_levels(levels, precision)`` classifies (bands, n) integer
+        levels whose NDVI is ``levels * precision``; it is only called for
+        distinct vectors not yet in the cache.
+        """
+        levels = self.quantize(pixels, scale, offset)
+        unique_keys, first, inverse = np.unique(self._keys(levels), return_index=True, return_inverse=True)
+        # Python ints (or bytes) hash much faster than NumPy scalars
+        lookup = unique_keys.tolist()
+
+        classes = np.empty(len(lookup), dtype=np.int64)
+        missing = []
+        with self._lock:
+            entries = self._entries
+            for i, key in enumerate(lookup):
+                cls = entries.get(key)
+                if cls is None:
+                    missing.append(i)
+                else:
+                    classes[i] = cls
+                    entries.move_to_end(key)
+
+        if missing:
+            missing = np.asarray(missing)
+            classes[missing] = predict_levels(levels[:, first[missing]], self.precision)
+            with self._lock:
+                entries = self._entries
+                for i in missing.tolist():
+                    entries[lookup[i]] = int(classes[i])
+                while len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+
+        stats = self._thread_stats()
+        stats['pixels'] += pixels.shape[1]
+        stats['unique'] += len(lookup)
+        stats['hits'] += len(lookup) - len(missing)
+        stats['predicted'] += len(missing)
+
+        return classes[inverse.ravel()]
+
+    def _thread_stats(self):
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            stats = self._local.stats = {'pixels': 0, 'unique': 0, 'hits': 0, 'predicted': 0}
+        return stats
+
+    def take_stats(self):
+        """This thread's counters since its last call: pixels, unique vectors, hits, predicted"""
+        stats = self._thread_stats()
+        self._local.stats = None
+        return stats
+
+
+def shared_cache(precision=PREDICTION_CACHE_PRECISION, max_entries=PREDICTION_CACHE_SIZE):
+    """The process-wide cache for ``precision``, created on first use"""
+    with _SHARED_LOCK:
+        cache = _SHARED_CACHES.get((precision, max_entries))
+        if cache is None:
+            cache = _SHARED_CACHES[(precision, max_entries)] = PredictionCache(precision, max_entries)
+    return cache
+
+
+def merge_stats(total, stats):
+    """Add one take_stats() result into a running total"""
+    for name, value in (stats or {}).items():
+        total[name] = total.get(name, 0) + value
+    return total
+
+
+def format_stats(stats):
+    """One-line summary of cache counters"""
+    pixels = stats.get('pixels', 0)
+    if not pixels:
+        return "no pixels looked up"
+    predicted = stats['predicted']
+    unique = stats['unique']
+    saving = f"{pixels / predicted:.1f}x fewer model evaluations" if predicted else "no model evaluations"
+    return (f"{pixels:,} pixels -> {unique:,} distinct vectors per block, "
+            f"{stats['hits']:,} cache hits ({stats['hits'] / max(1, unique):.1%}), "
+            f"{predicted:,} predicted ({saving})")
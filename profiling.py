@@ -0,0 +1,188 @@
+# profiling.py
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Sub-timer records of the current stage: name -> [calls, wall_s, cpu_s, pixels]
+_TIMERS = {}
+_LOCK = threading.Lock()
+
+
+@contextmanager
+def timer(name, pixels=None):
+    """Time a hot-path section; repeated calls with the same name add up
+
+    CPU time is measured for the calling thread, so sections running on
+    worker threads are not over-counted. Timers record into the current
+    process only; work done inside pool worker processes is not included.
+    """
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        with _LOCK:
+            record = _TIMERS.setdefault(name, [0, 0.0, 0.0, 0])
+            record[0] += 1
+            record[1] += wall
+            record[2] += cpu
+            record[3] += pixels or 0
+
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux only); True on success"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _children_peak_rss_mb():
+    """Largest peak RSS of any finished child process (e.g. pool workers)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _timer_rows(timers):
+    rows = []
+    for name, (calls, wall, cpu, pixels) in timers.items():
+        rows.append({
+            'timer': name,
+            'calls': calls,
+            'wall_s': round(wall, 4),
+            'cpu_s': round(cpu, 4),
+            'pixels': pixels or None,
+            'pixels_per_s': round(pixels / wall, 1) if pixels and wall > 0 else None
+        })
+    return rows
+
+
+@contextmanager
+def stage_profile(stage_name, results):
+    """Measure wall time, CPU time and peak RSS of a pipeline stage
+
+    A dict with the stage totals and its sub-timers is appended to
+    ``results`` when the block exits. The block may set ``cached`` or
+    ``success`` on the yielded dict.
+    """
+    with _LOCK:
+        _TIMERS.clear()
+    peak_reset = _reset_peak_rss()
+    record = {'stage': stage_name, 'success': False, 'cached': False}
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+        record['cpu_s'] = round(time.process_time() - cpu_start, 4)
+        record['peak_rss_mb'] = _peak_rss_mb()
+        # Without a reset the peak covers the whole process so far
+        record['peak_rss_scope'] = 'stage' if peak_reset else 'process'
+        record['children_peak_rss_mb'] = _children_peak_rss_mb()
+        with _LOCK:
+            record['timers'] = _timer_rows(_TIMERS)
+            _TIMERS.clear()
+        results.append(record)
+
+
+def write_run_report(results, report_dir, run_id):
+    """Write stage profiles as run_report_<run_id>.json and .csv"""
+    os.makedirs(report_dir, exist_ok=True)
+    json_path = os.path.join(report_dir, f"run_report_{run_id}.json")
+    csv_path = os.path.join(report_dir, f"run_report_{run_id}.csv")
+
+    with open(json_path, 'w') as f:
+        json.dump({'run_id': run_id, 'stages': results}, f, indent=2)
+
+    fields = ['stage', 'timer', 'calls', 'wall_s', 'cpu_s', 'pixels', 'pixels_per_s',
+              'peak_rss_mb', 'cached', 'success']
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for record in results:
+            writer.writerow({**record, 'timer': 'TOTAL', 'calls': 1})
+            for row in record['timers']:
+                writer.writerow({'stage': record['stage'], **row})
+    return json_path, csv_path
+
+
+def print_run_summary(results):
+    """Print a per-stage timing table"""
+    print("\n⏱️ STAGE PROFILE")
+    for record in results:
+        peak = record['peak_rss_mb']
+        peak_text = f"{peak:,.0f} MB" if peak is not None else "n/a"
+        status = "cached" if record['cached'] else ("ok" if record['success'] else "failed")
+        print(f"   {record['stage']}: {record['wall_s']:.2f} s wall, {record['cpu_s']:.2f} s CPU, "
+              f"peak {peak_text} ({status})")
+        for row in sorted(record['timers'], key=lambda r: -r['wall_s']):
+            rate = f", {row['pixels_per_s'] / 1e6:.2f} Mpx/s" if row['pixels_per_s'] else ""
+            print(f"      {row['timer']}: {row['wall_s']:.3f} s x{row['calls']}{rate}")
+
+
+def profile_call(func, output_path, profiler='cprofile'):
+    """Run ``func()`` under cProfile or pyinstrument and dump the profile
+
+    cProfile writes a .prof file readable with pstats/snakeviz; pyinstrument
+    writes an HTML report. Falls back to cProfile if pyinstrument is not
+    installed. Returns the result of ``func``.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    if profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("⚠️ pyinstrument not installed - using cProfile")
+            profiler = 'cprofile'
+        else:
+            session = Profiler()
+            session.start()
+            try:
+                return func()
+            finally:
+                session.stop()
+                html_path = os.path.splitext(output_path)[0] + '.html'
+                with open(html_path, 'w') as f:
+                    f.write(session.output_html())
+                print(f"💾 Profile saved: {html_path}")
+
+    import cProfile
+    session = cProfile.Profile()
+    try:
+        return session.runcall(func)
+    finally:
+        session.dump_stats(output_path)
+        print(f"💾 Profile saved: {output_path}")
@@ -0,0 +1,379 @@
+# query_service.py
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import rasterio
+import shapely.geometry
+from rasterio import features
+from rasterio.warp import transform, transform_geom
+from rasterio.windows import Window, from_bounds
+from shapely.errors import ShapelyError
+from config import *
+from model_registry import check_raster, load_model
+from raster_io import band_decoding, iter_windows
+
+# Latencies kept per endpoint for the percentile metrics
+LATENCY_WINDOW = 10000
+ENDPOINTS = ('/health', '/point', '/classify', '/bbox', '/polygon')
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class QueryError(Exception):
+    """A request the service cannot answer; reported as HTTP 400"""
+
+
+class HTTPError(Exception):
+    """A request for a missing endpoint or with the wrong method"""
+
+    def __init__(self, status):
+        super().__init__(REASONS[status])
+        self.status = status
+
+
+def prediction_memmap(prediction_path):
+    """Memory-map the prediction band, exporting it to .npy when stale
+
+    The GeoTIFF is compressed, so its band is copied window by window
+    into an uncompressed .npy next to it once per prediction version.
+    Every later start (and every service process) maps that file
+    read-only and shares its pages through the OS page cache.
+    """
+    npy_path = os.path.splitext(prediction_path)[0] + '.npy'
+    if not os.path.exists(npy_path) or os.path.getmtime(npy_path) < os.path.getmtime(prediction_path):
+        with rasterio.open(prediction_path) as src:
+            tmp_path = npy_path + '.tmp.npy'
+            band = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(src.height, src.width))
+            for window in iter_windows(src, 4096):
+                band[window.row_off:window.row_off + window.height,
+                     window.col_off:window.col_off + window.width] = src.read(1, window=window)
+            band.flush()
+            del band
+        os.replace(tmp_path, npy_path)
+    return np.load(npy_path, mmap_mode='r')
+
+
+class Metrics:
+    """Request counts, latency percentiles, throughput and batch sizes"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.latencies = {}
+        self.counts = {}
+        self.errors = 0
+        self.batches = 0
+        self.batched_points = 0
+        self.max_batch = 0
+
+    def record(self, endpoint, seconds, ok=True):
+        self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+        self.latencies.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+        if not ok:
+            self.errors += 1
+
+    def record_batch(self, size):
+        self.batches += 1
+        self.batched_points += size
+        self.max_batch = max(self.max_batch, size)
+
+    def snapshot(self):
+        uptime = time.perf_counter() - self.started
+        endpoints = {}
+        for endpoint, latencies in self.latencies.items():
+            ms = np.array(latencies) * 1000
+            endpoints[endpoint] = {
+                'requests': self.counts[endpoint],
+                'per_s': round(self.counts[endpoint] / uptime, 2),
+                'p50_ms': round(float(np.percentile(ms, 50)), 3),
+                'p95_ms': round(float(np.percentile(ms, 95)), 3),
+                'p99_ms': round(float(np.percentile(ms, 99)), 3)
+            }
+        return {
+            'uptime_s': round(uptime, 1),
+            'requests': sum(self.counts.values()),
+            'errors': self.errors,
+            'endpoints': endpoints,
+            'classify_batches': self.batches,
+            'mean_batch_size': round(self.batched_points / self.batches, 2) if self.batches else None,
+            'max_batch_size': self.max_batch
+        }
+
+
+class MicroBatcher:
+    """Gather concurrent point classifications into one vectorized predict
+
+    The first queued point opens a batch that collects further points for
+    up to ``max_wait`` seconds or ``max_batch`` points. The whole batch is
+    sampled from the NDVI raster and classified in one call on a worker
+    thread, so the event loop keeps accepting requests meanwhile.
+    """
+
+    def __init__(self, model, ndvi_src, metrics, max_batch=QUERY_MAX_BATCH, max_wait=QUERY_BATCH_WAIT_MS / 1000):
+        self.model = model
+        self.ndvi_src = ndvi_src
+        self.metrics = metrics
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        # One thread: the NDVI dataset handle is not shared between threads
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.predict_block = importlib.import_module('03_prediction_mapping').predict_block
+
+    async def classify(self, x, y):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(((x, y), future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            points = [point for point, _ in batch]
+            try:
+                classes = await loop.run_in_executor(self.executor, self._predict, points)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.metrics.record_batch(len(batch))
+            for (_, future), cls in zip(batch, classes):
+                if not future.done():
+                    future.set_result(int(cls))
+
+    def _predict(self, points):
+        """Sample the NDVI bands at points in its own CRS and classify them as one block"""
+        ndvi = np.array(list(self.ndvi_src.sample(points))).T
+        return self.predict_block(self.model, ndvi[:, np.newaxis, :], self.ndvi_src.nodata,
+                                  None, *band_decoding(self.ndvi_src))[0]
+
+
+class QueryService:
+    """Point, bbox and polygon queries against a resident prediction and model"""
+
+    def __init__(self, prediction_path=PREDICTION_PATH, ndvi_path=NDVI_2024_PATH):
+        with rasterio.open(prediction_path) as src:
+            self.crs = src.crs
+            self.transform = src.transform
+            self.height, self.width = src.height, src.width
+        self.prediction = prediction_memmap(prediction_path)
+        self.pixel_area_ha = abs(self.transform[0] * self.transform[4]) / 10000
+
+        self.ndvi_src = rasterio.open(ndvi_path)
+        check_raster(self.ndvi_src.count)
+        self.model = load_model()
+        if hasattr(self.model, 'n_jobs'):
+            # Batches are small; thread start-up would dominate
+            self.model.n_jobs = 1
+
+        self.metrics = Metrics()
+        self.batcher = MicroBatcher(self.model, self.ndvi_src, self.metrics)
+
+    @staticmethod
+    def _to_crs(xs, ys, src_crs, dst_crs):
+        if src_crs is None or dst_crs is None or src_crs == dst_crs:
+            return list(xs), list(ys)
+        return transform(src_crs, dst_crs, list(xs), list(ys))
+
+    def _to_raster_crs(self, xs, ys, src_crs):
+        return self._to_crs(xs, ys, src_crs, self.crs)
+
+    def _pixel(self, x, y):
+        col, row = ~self.transform * (x, y)
+        row, col = int(np.floor(row)), int(np.floor(col))
+        if not (0 <= row < self.height and 0 <= col < self.width):
+            raise QueryError("Point is outside the prediction raster")
+        return row, col
+
+    @staticmethod
+    def _point_params(params):
+        try:
+            return float(params['lon']), float(params['lat'])
+        except (KeyError, ValueError):
+            raise QueryError("lon and lat are required numbers")
+
+    def point(self, params):
+        """Stored prediction at a lon/lat"""
+        lon, lat = self._point_params(params)
+        (x,), (y,) = self._to_raster_crs([lon], [lat], 'EPSG:4326')
+        row, col = self._pixel(x, y)
+        cls = int(self.prediction[row, col])
+        return {'lon': lon, 'lat': lat, 'class': cls, 'crop': CROP_NAMES.get(cls)}
+
+    async def classify(self, params):
+        """Classify the NDVI pixel at a lon/lat with the resident model"""
+        lon, lat = self._point_params(params)
+        # The NDVI stack is sampled in its own CRS, which need not be the prediction's
+        (x,), (y,) = self._to_crs([lon], [lat], 'EPSG:4326', self.ndvi_src.crs)
+        row, col = self.ndvi_src.index(x, y)
+        if not (0 <= row < self.ndvi_src.height and 0 <= col < self.ndvi_src.width):
+            raise QueryError("Point is outside the NDVI raster")
+        cls = await self.batcher.classify(x, y)
+        return {'lon': lon, 'lat': lat, 'class': cls, 'crop': CROP_NAMES.get(cls)}
+
+    def _area(self, geometry):
+        """Crop areas of a raster-CRS geometry"""
+        left, bottom, right, top = features.bounds(geometry)
+        window = from_bounds(left, bottom, right, top, transform=self.transform)
+        row_off, col_off = max(0, int(np.floor(window.row_off))), max(0, int(np.floor(window.col_off)))
+        row_end = min(self.height, int(np.ceil(window.row_off + window.height)))
+        col_end = min(self.width, int(np.ceil(window.col_off + window.width)))
+
+        counts = np.zeros(256, dtype=np.int64)
+        if row_off < row_end and col_off < col_end:
+            block = self.prediction[row_off:row_end, col_off:col_end]
+            window = Window(col_off, row_off, col_end - col_off, row_end - row_off)
+            inside = features.geometry_mask([geometry], out_shape=block.shape,
+                                            transform=rasterio.windows.transform(window, self.transform),
+                                            invert=True)
+            counts = np.bincount(block[inside], minlength=256)
+
+        classified = int(counts.sum() - counts[NODATA_CLASS])
+        return {
+            'classified_pixels': classified,
+            'nodata_pixels': int(counts[NODATA_CLASS]),
+            'crops': [
+                {'class': int(cls), 'crop': CROP_NAMES.get(int(cls), f'Class {cls}'),
+                 'pixels': int(counts[cls]), 'area_ha': float(counts[cls] * self.pixel_area_ha),
+                 'percentage': float(counts[cls] / classified * 100)}
+                for cls in np.flatnonzero(counts) if cls != NODATA_CLASS
+            ]
+        }
+
+    def bbox(self, params):
+        """Crop areas inside a lon/lat bounding box"""
+        try:
+            bounds = [float(params[k]) for k in ('min_lon', 'min_lat', 'max_lon', 'max_lat')]
+        except (KeyError, ValueError):
+            raise QueryError("min_lon, min_lat, max_lon and max_lat are required numbers")
+        min_lon, min_lat, max_lon, max_lat = bounds
+        ring = [[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]
+        return self.polygon({'geometry': {'type': 'Polygon', 'coordinates': [ring]}})
+
+    def polygon(self, body):
+        """Crop areas inside a GeoJSON (lon/lat) polygon"""
+        geometry = body.get('geometry', body) if isinstance(body, dict) else None
+        if not isinstance(geometry, dict) or geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+            raise QueryError("Body must be a GeoJSON Polygon or MultiPolygon (or {'geometry': ...})")
+        try:
+            shape = shapely.geometry.shape(geometry)
+        except (ShapelyError, KeyError, TypeError, ValueError) as e:
+            raise QueryError(f"Invalid polygon coordinates: {e}")
+        if shape.is_empty:
+            raise QueryError("Polygon is empty")
+        geometry = shapely.geometry.mapping(shape)
+        if self.crs is not None:
+            geometry = transform_geom('EPSG:4326', self.crs, geometry)
+        return self._area(geometry)
+
+    async def handle(self, method, path, params, body):
+        if body is not None and not isinstance(body, dict):
+            raise QueryError("Request body must be a JSON object")
+        if path == '/health':
+            return {'status': 'ok'}
+        if path == '/metrics':
+            return self.metrics.snapshot()
+        if path == '/point':
+            return self.point(params)
+        if path == '/classify':
+            return await self.classify(params if method == 'GET' else body or {})
+        if path == '/bbox':
+            return self.bbox(params)
+        if path == '/polygon':
+            if method != 'POST':
+                raise HTTPError(405)
+            return self.polygon(body)
+        raise HTTPError(404)
+
+    async def serve_connection(self, reader, writer):
+        """Minimal HTTP/1.1 with keep-alive: JSON in, JSON out"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                raw_body = await reader.readexactly(length) if length else b''
+
+                start = time.perf_counter()
+                url = urlsplit(target)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                status = 200
+                try:
+                    body = json.loads(raw_body) if raw_body else None
+                    payload = await self.handle(method, url.path, params, body)
+                except (QueryError, json.JSONDecodeError) as e:
+                    status, payload = 400, {'error': str(e)}
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+                if url.path != '/metrics':
+                    endpoint = url.path if url.path in ENDPOINTS else 'other'
+                    self.metrics.record(endpoint, time.perf_counter() - start, ok=status == 200)
+
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    .encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=QUERY_HOST, port=QUERY_PORT):
+        batcher = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.serve_connection, host, port)
+        print(f"🛰️ Query service listening on http://{host}:{port} "
+              f"(/point, /classify, /bbox, /polygon, /metrics)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self.ndvi_src.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve crop queries over HTTP")
+    parser.add_argument('--host', default=QUERY_HOST)
+    parser.add_argument('--port', type=int, default=QUERY_PORT)
+    parser.add_argument('--prediction', default=PREDICTION_PATH, help="Prediction raster")
+    parser.add_argument('--ndvi', default=NDVI_2024_PATH, help="NDVI stack used by /classify")
+    args = parser.parse_args()
+
+    service = QueryService(args.prediction, args.ndvi)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,135 @@
+# raster_io.py
+import math
+import os
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.shutil import copy as copy_raster
+from rasterio.windows import Window
+from ndvi_features import INT16_NODATA, INT16_SCALE, quantize_ndvi
+
+
+def iter_windows(src, window_size=None):
+    """Yield read/write windows covering the raster.
+
+    With ``window_size=None`` the whole raster is a single window. Otherwise
+    square ``window_size`` tiles are yielded in row-major order, clipped to
+    the raster edges.
+    """
+    if window_size is None:
+        yield Window(0, 0, src.width, src.height)
+        return
+
+    for row_off in range(0, src.height, window_size):
+        height = min(window_size, src.height - row_off)
+        for col_off in range(0, src.width, window_size):
+            width = min(window_size, src.width - col_off)
+            yield Window(col_off, row_off, width, height)
+
+
+def pool_size(workers, n_tasks=None):
+    """Processes to start for ``workers`` (0 = every core), at most one per task"""
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if n_tasks is not None:
+        workers = max(1, min(workers, n_tasks))
+    return workers
+
+
+def valid_mask(block, nodata=None):
+    """Boolean (rows, cols) mask of pixels that are valid in every band
+
+    A pixel is invalid if any band is NaN/inf or equals ``nodata``.
+    """
+    valid = np.isfinite(block).all(axis=0)
+    if nodata is not None and not np.isnan(nodata):
+        valid &= (block != nodata).all(axis=0)
+    return valid
+
+
+def band_decoding(src):
+    """(scale, offset) turning the raster's stored values into NDVI
+
+    Float rasters have (1.0, 0.0); compact int16 rasters carry
+    1 / INT16_SCALE as their band scale. All bands must share one encoding.
+    """
+    if len(set(src.scales)) > 1 or len(set(src.offsets)) > 1:
+        raise ValueError("NDVI bands must share one scale and offset")
+    return src.scales[0], src.offsets[0]
+
+
+def quantized_profile(profile):
+    """Copy of a raster profile switched to the compact int16 NDVI encoding"""
+    profile = profile.copy()
+    profile.update({'dtype': 'int16', 'nodata': INT16_NODATA, 'predictor': 2})
+    return profile
+
+
+def write_quantized_ndvi(src_path, dst_path, window_size=1024):
+    """Convert a float NDVI stack to the compact int16 encoding, window by window
+
+    Values are stored as round(NDVI * INT16_SCALE) with INT16_NODATA for
+    missing pixels, and every band's scale is set to 1 / INT16_SCALE so
+    readers decode them back to NDVI.
+    """
+    with rasterio.open(src_path) as src:
+        profile = quantized_profile(src.profile)
+        with rasterio.open(dst_path, 'w', **profile) as dst:
+            dst.scales = [1.0 / INT16_SCALE] * src.count
+            for window in iter_windows(src, window_size):
+                dst.write(quantize_ndvi(src.read(window=window), src.nodata), window=window)
+    return dst_path
+
+
+def decimated_shape(src, max_width, max_height, window=None):
+    """(rows, cols) read_decimated returns: fits the bounds, keeps the aspect, never upsamples"""
+    width = window.width if window is not None else src.width
+    height = window.height if window is not None else src.height
+    scale = max(width / max_width, height / max_height, 1.0)
+    return max(1, math.ceil(height / scale)), max(1, math.ceil(width / scale))
+
+
+def read_decimated(src, max_width, max_height, band=1, resampling=Resampling.mode, window=None):
+    """Read a band at the largest size fitting ``max_width`` x ``max_height``
+
+    The aspect ratio is kept and the raster (or ``window``) is never
+    upsampled. GDAL serves a reduced read from the closest internal
+    overview when the raster has them; otherwise the full-resolution blocks
+    are resampled on the fly. Use mode resampling for class rasters so
+    pixels stay valid classes.
+    """
+    out_shape = decimated_shape(src, max_width, max_height, window)
+    return src.read(band, window=window, out_shape=out_shape, resampling=resampling)
+
+
+def streaming_profile(profile, window_size):
+    """Return a copy of ``profile`` tiled to match the streaming windows"""
+    profile = profile.copy()
+    if window_size is not None and window_size % 16 == 0:
+        profile.update({
+            'tiled': True,
+            'blockxsize': window_size,
+            'blockysize': window_size
+        })
+    return profile
+
+
+def write_cog(src_path, dst_path, block_size=512, compress='ZSTD', resampling='mode'):
+    """Copy a raster to a Cloud-Optimized GeoTIFF with internal overviews
+
+    GDAL's COG driver reads the source block by block, so a raster written
+    window by window can be converted without loading it whole. Overviews
+    are halved until they fit in one tile; use ``resampling='mode'`` for
+    class rasters so overview pixels stay valid classes. The source nodata
+    value is kept.
+    """
+    copy_raster(
+        src_path, dst_path,
+        driver='COG',
+        BLOCKSIZE=block_size,
+        COMPRESS=compress,
+        PREDICTOR='YES',
+        OVERVIEW_RESAMPLING=resampling.upper(),
+        BIGTIFF='IF_SAFER'
+    )
+    return dst_path
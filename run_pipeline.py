@@ -1,197 +1,365 @@
-# run_pipeline.py
-import os
-import subprocess
-import sys
-from datetime import datetime
-
-def create_dummy_data():
-    """Create dummy data files for testing if real data isn't available"""
-    print("📁 Creating dummy data structure for testing...")
-    
-    # Create dummy NDVI file (you'll replace this with real data)
-    dummy_ndvi_path = "data/raw/2024_NDVI.tif"
-    os.makedirs(os.path.dirname(dummy_ndvi_path), exist_ok=True)
-    
-    # If NDVI file is missing or invalid, create a small synthetic raster
-    needs_synthetic = not os.path.exists(dummy_ndvi_path) or os.path.getsize(dummy_ndvi_path) == 0
-    if needs_synthetic:
-        print("⚠️  Please add your actual NDVI TIFF file to: data/raw/2024_NDVI.tif")
-        print("   Creating a small synthetic NDVI raster for demo...")
-        try:
-            import numpy as np
-            import rasterio
-            from rasterio.transform import from_origin
-            width, height, count = 100, 100, 3
-            transform = from_origin(77.0, 13.5, 0.001, 0.001)
-            profile = {
-                'driver': 'GTiff',
-                'dtype': 'float32',
-                'width': width,
-                'height': height,
-                'count': count,
-                'crs': 'EPSG:4326',
-                'transform': transform,
-                'compress': 'lzw'
-            }
-            data = np.clip(np.random.normal(loc=0.4, scale=0.2, size=(count, height, width)).astype('float32'), -1.0, 1.0)
-            with rasterio.open(dummy_ndvi_path, 'w', **profile) as dst:
-                dst.write(data)
-        except Exception as e:
-            print(f"❌ Failed to create synthetic NDVI: {e}")
-    
-    # Create dummy boundaries directory
-    boundaries_dir = "data/boundaries"
-    os.makedirs(boundaries_dir, exist_ok=True)
-    
-    print("✅ Project structure created!")
-
-def run_script(script_name):
-    """Run a Python script and capture output"""
-    print(f"\n{'='*60}")
-    print(f"🚀 RUNNING: {script_name}")
-    print(f"{'='*60}")
-    
-    script_path = os.path.join('scripts', script_name)
-    
-    if not os.path.exists(script_path):
-        print(f"❌ Script not found: {script_path}")
-        return False
-    
-    try:
-        # Run the script and capture output in real-time
-        result = subprocess.run(
-            [sys.executable, script_path], 
-            capture_output=True, 
-            text=True, 
-            cwd='.'  # Run from project root
-        )
-        
-        if result.returncode == 0:
-            print(f"✅ {script_name} completed successfully!")
-            
-            # Print last few lines of output
-            if result.stdout:
-                lines = result.stdout.strip().split('\n')
-                print("📋 Output preview:")
-                for line in lines[-5:]:  # Last 5 lines
-                    if line.strip():
-                        print(f"   {line}")
-            
-            return True
-        else:
-            print(f"❌ {script_name} failed with exit code: {result.returncode}")
-            if result.stderr:
-                print("🔴 Error output:")
-                for line in result.stderr.strip().split('\n')[-10:]:  # Last 10 error lines
-                    if line.strip():
-                        print(f"   {line}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Error running {script_name}: {e}")
-        return False
-
-def check_dependencies():
-    """Check if required packages are installed"""
-    print("🔍 Checking dependencies...")
-    
-    required_packages = [
-        'rasterio', 'geopandas', 'numpy', 'pandas', 
-        'matplotlib', 'sklearn', 'folium', 'joblib'
-    ]
-    
-    missing_packages = []
-    
-    for package in required_packages:
-        try:
-            __import__(package)
-            print(f"   ✅ {package}")
-        except ImportError:
-            missing_packages.append(package)
-            print(f"   ❌ {package}")
-    
-    if missing_packages:
-        print(f"\n⚠️  Missing packages: {missing_packages}")
-        print("   Install them using:")
-        print("   pip install " + " ".join(missing_packages))
-        return False
-    
-    print("✅ All dependencies are available!")
-    return True
-
-def main():
-    """Run the complete pipeline"""
-    
-    print("🌾 ENHANCED CROP CLASSIFICATION PIPELINE")
-    print("=" * 50)
-    print(f"⏰ Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 50)
-    
-    # Create project structure
-    create_dummy_data()
-    
-    # Check dependencies
-    if not check_dependencies():
-        print("\n❌ Please install missing dependencies first!")
-        return
-    
-    # Define the pipeline steps
-    scripts = [
-        '01_data_preprocessing.py',
-        '02_model_training.py', 
-        '03_prediction_mapping.py',
-        '04_district_analysis.py',
-        '05_visualization.py',
-        '06_dashboard.py'
-    ]
-    
-    # Track success/failure
-    successful_steps = []
-    failed_steps = []
-    
-    # Run each script in sequence
-    for script in scripts:
-        if run_script(script):
-            successful_steps.append(script)
-        else:
-            failed_steps.append(script)
-            print(f"\n🛑 Pipeline stopped due to failure in: {script}")
-            break
-    
-    # Final summary
-    print(f"\n{'='*50}")
-    print("📊 PIPELINE EXECUTION SUMMARY")
-    print(f"{'='*50}")
-    print(f"✅ Successful steps: {len(successful_steps)}/{len(scripts)}")
-    print(f"❌ Failed steps: {len(failed_steps)}/{len(scripts)}")
-    print(f"⏰ Finished at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    
-    if not failed_steps:
-        print(f"\n🎉 PIPELINE COMPLETED SUCCESSFULLY!")
-        
-        # Show output files
-        print("\n📁 OUTPUT FILES GENERATED:")
-        output_files = [
-            "data/processed/training_data.csv",
-            "models/crop_classifier.pkl", 
-            "outputs/predictions/tumkur_2025_prediction.tif",
-            "outputs/reports/districtwise_crop_area_2025.csv",
-            "outputs/maps/enhanced_crop_map_2025.png",
-            "outputs/maps/interactive_crop_map.html"
-        ]
-        
-        for output_file in output_files:
-            if os.path.exists(output_file):
-                file_size = os.path.getsize(output_file) / 1024  # KB
-                print(f"  ✅ {output_file} ({file_size:.1f} KB)")
-            else:
-                print(f"  ❌ {output_file} (missing)")
-    else:
-        print(f"\n💡 TROUBLESHOOTING TIPS:")
-        print("   1. Check if your NDVI data file exists: data/raw/2024_NDVI.tif")
-        print("   2. Verify all dependencies are installed")
-        print("   3. Check the error messages above")
-        print("   4. Try running individual scripts to isolate the issue")
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+# run_pipeline.py
+import argparse
+import importlib
+import os
+import sys
+import traceback
+from datetime import datetime
+
+# Stage modules and config live next to this file
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from config import *
+from profiling import print_run_summary, profile_call, stage_profile, write_run_report
+
+def create_dummy_data():
+    """Create dummy data files for testing if real data isn't available"""
+    print("📁 Creating dummy data structure for testing...")
+    
+    # Create dummy NDVI file (you'll replace this with real data)
+    os.makedirs(os.path.dirname(NDVI_2024_PATH), exist_ok=True)
+    
+    # If NDVI file is missing or invalid, create a small synthetic raster
+    needs_synthetic = not os.path.exists(NDVI_2024_PATH) or os.path.getsize(NDVI_2024_PATH) == 0
+    if needs_synthetic:
+        print("⚠️  Please add your actual NDVI TIFF file to: data/raw/2024_NDVI.tif")
+        print("   Creating a small synthetic NDVI raster for demo...")
+        try:
+            from synthetic_data import write_synthetic_ndvi
+            write_synthetic_ndvi(NDVI_2024_PATH, 100, n_bands=3, dtype=NDVI_DTYPE)
+        except Exception as e:
+            print(f"❌ Failed to create synthetic NDVI: {e}")
+    
+    # Create dummy boundaries so the district analysis and dashboard can run
+    os.makedirs(BOUNDARIES_DIR, exist_ok=True)
+    if os.path.exists(NDVI_2024_PATH) and not os.path.exists(DISTRICTS_SHP) and not os.path.exists(TALUKS_SHP):
+        print("   Creating synthetic district and taluk boundaries for demo...")
+        try:
+            from synthetic_data import write_synthetic_boundaries
+            write_synthetic_boundaries(NDVI_2024_PATH, DISTRICTS_SHP, TALUKS_SHP)
+        except Exception as e:
+            print(f"❌ Failed to create synthetic boundaries: {e}")
+    
+    print("✅ Project structure created!")
+
+def load_stage(module_name):
+    """Import a numbered stage module (e.g. '03_prediction_mapping')"""
+    return importlib.import_module(module_name)
+
+def stage_preprocessing(context):
+    stage = load_stage('01_data_preprocessing')
+    df, profile = stage.prepare_training_data()
+    if df is None:
+        return False
+    stage.save_training_data(df)
+    context['training_data'] = df
+    return True
+
+def stage_training(context):
+    from model_registry import save_model
+    stage = load_stage('02_model_training')
+    model, features = stage.train_crop_classifier(context.get('training_data'))
+    if model is None:
+        return False
+    save_model(model, features)
+    print(f"💾 Model saved to: {MODEL_PATH}")
+    context['model'] = model
+    return True
+
+def stage_prediction(context):
+    stage = load_stage('03_prediction_mapping')
+    context['prediction_path'] = stage.create_prediction_map(model=context.get('model'))
+    return context['prediction_path'] is not None
+
+def stage_district_analysis(context):
+    stage = load_stage('04_district_analysis')
+    district_stats, taluk_stats = stage.generate_reports(context.get('prediction_path', PREDICTION_PATH))
+    context['district_stats'] = district_stats
+    return True
+
+def stage_visualization(context):
+    stage = load_stage('05_visualization')
+    stage.create_enhanced_map(
+        context.get('prediction_path', PREDICTION_PATH),
+        os.path.join(OUTPUT_DIR, 'maps', 'enhanced_crop_map_2025.png')
+    )
+    stage.create_pie_chart(
+        os.path.join(OUTPUT_DIR, 'reports', 'districtwise_crop_area_2025.csv'),
+        context.get('district_stats')
+    )
+    if ATLAS_LEVEL:
+        stage.create_atlas(context.get('prediction_path', PREDICTION_PATH), ATLAS_LEVEL)
+    return True
+
+def stage_dashboard(context):
+    stage = load_stage('06_dashboard')
+    stage.create_interactive_map(context.get('prediction_path', PREDICTION_PATH))
+    return True
+
+def stage_change_detection(context):
+    if not CHANGE_BASELINE_PATH:
+        print("⏭️ No CHANGE_BASELINE_PATH configured - skipping change detection")
+        return True
+    stage = load_stage('07_change_detection')
+    stage.detect_changes(CHANGE_BASELINE_PATH, context.get('prediction_path', PREDICTION_PATH))
+    return True
+
+def _shapefile_parts(shp_path):
+    """Glob matching a shapefile and its sidecar files"""
+    return os.path.splitext(shp_path)[0] + '.*'
+
+# Pipeline stages in execution order. Besides its callable, each stage
+# declares what its result depends on (code files, input files, config
+# names) and the files it produces, so the stage cache can skip it.
+STAGES = [
+    {
+        'name': '01_data_preprocessing',
+        'run': stage_preprocessing,
+        'code': ['01_data_preprocessing.py', 'ndvi_features.py', 'sampling.py',
+                 'raster_io.py', 'training_store.py'],
+        'inputs': [NDVI_2024_PATH],
+        'config': ['SAMPLES_PER_CLASS', 'SAMPLE_SEED', 'SAMPLING_WINDOW_SIZE', 'EXPORT_TRAINING_CSV'],
+        'outputs': [TRAINING_STORE_DIR] + ([TRAINING_CSV_PATH] if EXPORT_TRAINING_CSV else [])
+    },
+    {
+        'name': '02_model_training',
+        'run': stage_training,
+        'code': ['02_model_training.py', 'ndvi_features.py', 'training_store.py',
+                 'model_registry.py'],
+        'inputs': [TRAINING_STORE_DIR],
+        'config': ['RANDOM_STATE', 'N_ESTIMATORS', 'TEST_SIZE'],
+        'outputs': [MODEL_PATH, os.path.join(MODELS_DIR, 'model.json')]
+    },
+    {
+        'name': '03_prediction_mapping',
+        'run': stage_prediction,
+        'code': ['03_prediction_mapping.py', 'ndvi_features.py', 'raster_io.py',
+                 'model_registry.py', 'prediction_cache.py'],
+        'inputs': [NDVI_2024_PATH, MODEL_PATH]
+                  + ([_shapefile_parts(PREDICTION_AOI_PATH)] if PREDICTION_AOI_PATH else []),
+        'config': ['PREDICTION_WINDOW_SIZE', 'NODATA_CLASS', 'PREDICTION_AOI_PATH',
+                   'PREDICTION_CACHE_PRECISION',
+                   'PREDICTION_FORMAT', 'COG_BLOCK_SIZE', 'COG_COMPRESS'],
+        'outputs': [PREDICTION_PATH]
+    },
+    {
+        'name': '04_district_analysis',
+        'run': stage_district_analysis,
+        'code': ['04_district_analysis.py', 'raster_io.py'],
+        'inputs': [PREDICTION_PATH, _shapefile_parts(DISTRICTS_SHP), _shapefile_parts(TALUKS_SHP)],
+        'config': ['ZONAL_STATS_MODE', 'REPORT_STATE_LEVEL', 'STATE_NAME', 'CROP_NAMES'],
+        'outputs': [os.path.join(OUTPUT_DIR, 'reports', '*_crop_area_2025.csv')]
+    },
+    {
+        'name': '05_visualization',
+        'run': stage_visualization,
+        'code': ['05_visualization.py', 'raster_io.py'],
+        'inputs': [PREDICTION_PATH, os.path.join(OUTPUT_DIR, 'reports', 'districtwise_crop_area_2025.csv')]
+                  + ([_shapefile_parts(DISTRICTS_SHP if ATLAS_LEVEL == 'district' else TALUKS_SHP)]
+                     if ATLAS_LEVEL else []),
+        'config': ['COLOR_MAP', 'CROP_NAMES', 'NODATA_CLASS', 'ATLAS_LEVEL', 'ATLAS_MAP_SIZE'],
+        'outputs': [os.path.join(OUTPUT_DIR, 'maps', 'enhanced_crop_map_2025.png'),
+                    os.path.join(OUTPUT_DIR, 'maps', 'crop_distribution_pie.png')]
+                   + ([os.path.join(ATLAS_DIR, ATLAS_LEVEL)] if ATLAS_LEVEL else [])
+    },
+    {
+        'name': '06_dashboard',
+        'run': stage_dashboard,
+        'code': ['06_dashboard.py', 'tile_pyramid.py', 'vector_layers.py'],
+        'inputs': [PREDICTION_PATH, _shapefile_parts(DISTRICTS_SHP), _shapefile_parts(TALUKS_SHP),
+                   os.path.join(OUTPUT_DIR, 'reports', '*_crop_area_2025.csv')],
+        'config': ['COLOR_MAP', 'CROP_NAMES', 'NODATA_CLASS', 'TILE_MIN_ZOOM', 'TILE_MAX_ZOOM',
+                   'VECTOR_ZOOMS', 'VECTOR_SIMPLIFY_PIXELS', 'DASHBOARD_ZOOM'],
+        'outputs': [os.path.join(OUTPUT_DIR, 'maps', 'interactive_crop_map.html'), TILES_DIR, VECTOR_DIR]
+    },
+    {
+        'name': '07_change_detection',
+        'run': stage_change_detection,
+        'code': ['07_change_detection.py', '04_district_analysis.py', 'raster_io.py'],
+        'inputs': [PREDICTION_PATH, _shapefile_parts(DISTRICTS_SHP), _shapefile_parts(TALUKS_SHP)]
+                  + ([CHANGE_BASELINE_PATH] if CHANGE_BASELINE_PATH else []),
+        'config': ['CHANGE_BASELINE_PATH', 'CHANGE_WINDOW_SIZE', 'CROP_NAMES', 'NODATA_CLASS'],
+        'outputs': [CHANGE_DIR] if CHANGE_BASELINE_PATH else []
+    }
+]
+
+def run_stage(stage, context, cache=None, force=False, profile=None):
+    """Run one stage in this process, passing results on through ``context``
+    
+    With a ``cache``, the stage is skipped when its fingerprint matches a
+    cached run (unless ``force``); its outputs are restored from the cache.
+    ``profile`` is the stage's profiling record; with ``profile['dump']``
+    set to (path, profiler) the stage also runs under that profiler.
+    """
+    stage_name = stage['name']
+    profile = profile if profile is not None else {}
+    print(f"\n{'='*60}")
+    print(f"🚀 RUNNING: {stage_name}")
+    print(f"{'='*60}")
+    
+    try:
+        fingerprint = None
+        if cache is not None:
+            code = [os.path.join(PROJECT_DIR, path) for path in stage['code']]
+            fingerprint = cache.fingerprint(code, stage['inputs'], stage['config'])
+            if not force and cache.restore(stage_name, fingerprint):
+                print(f"♻️ {stage_name} unchanged - outputs restored from cache ({fingerprint[:12]})")
+                profile.update(cached=True, success=True)
+                return True
+        
+        if 'dump' in profile:
+            dump_path, profiler = profile.pop('dump')
+            succeeded = profile_call(lambda: stage['run'](context), dump_path, profiler)
+        else:
+            succeeded = stage['run'](context)
+        
+        if succeeded:
+            if cache is not None:
+                cache.store(stage_name, fingerprint, stage['outputs'])
+            print(f"✅ {stage_name} completed successfully!")
+            profile['success'] = True
+            return True
+        print(f"❌ {stage_name} failed!")
+        return False
+    except Exception as e:
+        print(f"❌ Error running {stage_name}: {e}")
+        print("🔴 Error output:")
+        for line in traceback.format_exc().strip().split('\n')[-10:]:  # Last 10 error lines
+            if line.strip():
+                print(f"   {line}")
+        return False
+
+def check_dependencies():
+    """Check if required packages are installed"""
+    print("🔍 Checking dependencies...")
+    
+    required_packages = [
+        'rasterio', 'geopandas', 'numpy', 'pandas', 
+        'matplotlib', 'sklearn', 'folium', 'joblib'
+    ]
+    
+    missing_packages = []
+    
+    for package in required_packages:
+        try:
+            __import__(package)
+            print(f"   ✅ {package}")
+        except ImportError:
+            missing_packages.append(package)
+            print(f"   ❌ {package}")
+    
+    if missing_packages:
+        print(f"\n⚠️  Missing packages: {missing_packages}")
+        print("   Install them using:")
+        print("   pip install " + " ".join(missing_packages))
+        return False
+    
+    print("✅ All dependencies are available!")
+    return True
+
+def main(force=(), use_cache=True, profile_stage=None, profiler='cprofile'):
+    """Run the complete pipeline
+    
+    ``force`` lists stage names (or 'all') to rerun even when cached;
+    ``use_cache=False`` disables the stage cache altogether. Every stage is
+    profiled into a run report; ``profile_stage`` additionally runs one
+    stage under ``profiler`` ('cprofile' or 'pyinstrument').
+    """
+    run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    
+    print("🌾 ENHANCED CROP CLASSIFICATION PIPELINE")
+    print("=" * 50)
+    print(f"⏰ Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 50)
+    
+    # Create project structure
+    create_dummy_data()
+    
+    # Check dependencies
+    if not check_dependencies():
+        print("\n❌ Please install missing dependencies first!")
+        return
+    
+    # Track success/failure
+    successful_steps = []
+    failed_steps = []
+    
+    cache = None
+    if use_cache:
+        from stage_cache import StageCache
+        cache = StageCache()
+    
+    # Run each stage in sequence, handing results over in memory
+    context = {}
+    stage_profiles = []
+    for stage in STAGES:
+        stage_name = stage['name']
+        stage_forced = 'all' in force or stage_name in force or stage_name[:2] in force
+        with stage_profile(stage_name, stage_profiles) as profile:
+            if profile_stage in (stage_name, stage_name[:2]):
+                dump_path = os.path.join(OUTPUT_DIR, 'reports', f"profile_{stage_name}_{run_id}.prof")
+                profile['dump'] = (dump_path, profiler)
+                # A cached stage has nothing to profile
+                stage_forced = True
+            stage_ok = run_stage(stage, context, cache, force=stage_forced, profile=profile)
+        if stage_ok:
+            successful_steps.append(stage_name)
+        else:
+            failed_steps.append(stage_name)
+            print(f"\n🛑 Pipeline stopped due to failure in: {stage_name}")
+            break
+    
+    # Final summary
+    print(f"\n{'='*50}")
+    print("📊 PIPELINE EXECUTION SUMMARY")
+    print(f"{'='*50}")
+    print(f"✅ Successful steps: {len(successful_steps)}/{len(STAGES)}")
+    print(f"❌ Failed steps: {len(failed_steps)}/{len(STAGES)}")
+    print(f"⏰ Finished at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    print_run_summary(stage_profiles)
+    json_path, csv_path = write_run_report(stage_profiles, os.path.join(OUTPUT_DIR, 'reports'), run_id)
+    print(f"💾 Run report saved: {json_path}")
+    
+    if not failed_steps:
+        print(f"\n🎉 PIPELINE COMPLETED SUCCESSFULLY!")
+        
+        # Show output files
+        print("\n📁 OUTPUT FILES GENERATED:")
+        output_files = [
+            "data/processed/training_data/schema.json",
+            "models/crop_classifier.pkl", 
+            "outputs/predictions/tumkur_2025_prediction.tif",
+            "outputs/reports/districtwise_crop_area_2025.csv",
+            "outputs/maps/enhanced_crop_map_2025.png",
+            "outputs/maps/interactive_crop_map.html"
+        ]
+        
+        for output_file in output_files:
+            if os.path.exists(os.path.join(BASE_DIR, output_file)):
+                file_size = os.path.getsize(os.path.join(BASE_DIR, output_file)) / 1024  # KB
+                print(f"  ✅ {output_file} ({file_size:.1f} KB)")
+            else:
+                print(f"  ❌ {output_file} (missing)")
+    else:
+        print(f"\n💡 TROUBLESHOOTING TIPS:")
+        print("   1. Check if your NDVI data file exists: data/raw/2024_NDVI.tif")
+        print("   2. Verify all dependencies are installed")
+        print("   3. Check the error messages above")
+        print("   4. Try running individual stage scripts to isolate the issue")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the crop classification pipeline")
+    parser.add_argument('--force', action='append', default=[], metavar='STAGE',
+                        help="Rerun a stage even if cached (name, number like 03, or 'all'); repeatable")
+    parser.add_argument('--no-cache', action='store_true', help="Disable the stage cache")
+    parser.add_argument('--profile-stage', metavar='STAGE',
+                        help="Dump a detailed profile of one stage (name or number like 03)")
+    parser.add_argument('--profiler', choices=['cprofile', 'pyinstrument'], default='cprofile',
+                        help="Profiler used with --profile-stage")
+    args = parser.parse_args()
+    
+    main(force=args.force, use_cache=not args.no_cache,
+         profile_stage=args.profile_stage, profiler=args.profiler)
\ No newline at end of file
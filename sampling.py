@@ -0,0 +1,65 @@
+# sampling.py
+import numpy as np
+
+
+class StratifiedReservoir:
+    """Fixed-size uniform sample of feature columns per class
+
+    Rows are streamed in with add(); each class keeps at most ``quota``
+    samples, chosen uniformly over everything seen so far (bottom-k on a
+    random key per sample). Memory stays within about twice ``quota`` per
+    class however many pixels are streamed. With ``quota=None`` every
+    sample is kept.
+    """
+
+    def __init__(self, quota, seed=None):
+        self.quota = quota
+        self.rng = np.random.default_rng(seed)
+        self.seen = {}
+        self._keys = {}
+        self._rows = {}
+        self._stored = {}
+
+    def add(self, rows, labels):
+        """Add a (features, samples) block with one class label per sample"""
+        keys = self.rng.random(labels.size)
+
+        for cls in np.unique(labels):
+            selected = labels == cls
+            cls = int(cls)
+            self.seen[cls] = self.seen.get(cls, 0) + int(selected.sum())
+
+            self._keys.setdefault(cls, []).append(keys[selected])
+            self._rows.setdefault(cls, []).append(rows[:, selected])
+            self._stored[cls] = self._stored.get(cls, 0) + int(selected.sum())
+
+            # Only compact once the class overflows twice its quota
+            if self.quota is not None and self._stored[cls] > 2 * self.quota:
+                self._compact(cls)
+
+    def _compact(self, cls):
+        """Concatenate a class's pending blocks and trim them to the quota"""
+        cls_keys = np.concatenate(self._keys[cls])
+        cls_rows = np.concatenate(self._rows[cls], axis=1)
+
+        if self.quota is not None and cls_keys.size > self.quota:
+            keep = np.argpartition(cls_keys, self.quota - 1)[:self.quota]
+            cls_keys = cls_keys[keep]
+            cls_rows = cls_rows[:, keep]
+
+        self._keys[cls] = [cls_keys]
+        self._rows[cls] = [cls_rows]
+        self._stored[cls] = cls_keys.size
+
+    def samples(self):
+        """Return (rows, labels) for all classes, ordered by class then key"""
+        rows, labels = [], []
+        for cls in sorted(self._keys):
+            self._compact(cls)
+            order = np.argsort(self._keys[cls][0], kind='stable')
+            rows.append(self._rows[cls][0][:, order])
+            labels.append(np.full(order.size, cls, dtype=np.int64))
+
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64)
+        return np.concatenate(rows, axis=1), np.concatenate(labels)
@@ -0,0 +1,194 @@
+# stage_cache.py
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+import config
+from hashing import file_sha256
+
+HASH_MEMO_NAME = 'file_hashes.json'
+
+
+def _expand(paths):
+    """Expand files, directories and glob patterns into sorted file paths"""
+    files = []
+    for path in paths:
+        matches = glob.glob(path) if glob.has_magic(path) else [path]
+        for match in matches:
+            if os.path.isdir(match):
+                for root, _, names in os.walk(match):
+                    files.extend(os.path.join(root, name) for name in names)
+            elif os.path.exists(match):
+                files.append(match)
+    return sorted(set(files))
+
+
+class StageCache:
+    """Content-addressed cache of pipeline stage outputs
+
+    A stage's fingerprint hashes its code files, input files and the
+    config values it depends on. Outputs are stored once per content hash
+    under ``objects/`` and each fingerprint gets a manifest under
+    ``stages/<stage>/`` mapping output paths to those hashes. When a
+    fingerprint is already known the outputs are restored and the stage is
+    skipped. The store is kept under ``max_bytes`` by evicting the least
+    recently used manifests.
+    """
+
+    def __init__(self, cache_dir=config.STAGE_CACHE_DIR, max_bytes=config.STAGE_CACHE_MAX_BYTES,
+                 base_dir=config.BASE_DIR):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.base_dir = base_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.stages_dir = os.path.join(cache_dir, 'stages')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.stages_dir, exist_ok=True)
+
+        # Hashes of unchanged files are reused based on size and mtime; the
+        # memo is read once and written back once per public call
+        self._memo_path = os.path.join(cache_dir, HASH_MEMO_NAME)
+        self._memo = {}
+        self._memo_changed = False
+        if os.path.exists(self._memo_path):
+            with open(self._memo_path) as f:
+                self._memo = json.load(f)
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        entry = self._memo.get(key)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        digest = file_sha256(path)
+        self._memo[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        self._memo_changed = True
+        return digest
+
+    def _save_memo(self):
+        if not self._memo_changed:
+            return
+        with open(self._memo_path + '.tmp', 'w') as f:
+            json.dump(self._memo, f)
+        os.replace(self._memo_path + '.tmp', self._memo_path)
+        self._memo_changed = False
+
+    def _relative(self, path):
+        return os.path.relpath(os.path.abspath(path), self.base_dir)
+
+    def fingerprint(self, code, inputs, config_names):
+        """Hash a stage's code files, input files and config values"""
+        digest = hashlib.sha256()
+        for kind, paths in (('code', code), ('input', inputs)):
+            for pattern in paths:
+                files = _expand([pattern])
+                if not files:
+                    digest.update(f"{kind}:{self._relative(pattern)}:missing\n".encode())
+                for path in files:
+                    digest.update(f"{kind}:{self._relative(path)}:{self.file_hash(path)}\n".encode())
+        for name in sorted(config_names):
+            value = json.dumps(getattr(config, name), sort_keys=True, default=repr)
+            digest.update(f"config:{name}={value}\n".encode())
+        self._save_memo()
+        return digest.hexdigest()
+
+    def _manifest_path(self, stage_name, fingerprint):
+        return os.path.join(self.stages_dir, stage_name, f"{fingerprint}.json")
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def restore(self, stage_name, fingerprint):
+        """Put a cached stage's outputs back in place; False on a cache miss
+
+        Files under the stage's declared output directories and patterns
+        that the manifest does not list are removed, so a restored
+        directory holds exactly the cached files.
+        """
+        manifest_path = self._manifest_path(stage_name, fingerprint)
+        if not os.path.exists(manifest_path):
+            return False
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+        outputs = manifest['outputs']
+        if not all(os.path.exists(self._object_path(d)) for d in outputs.values()):
+            return False
+
+        restored = {os.path.join(self.base_dir, rel_path) for rel_path in outputs}
+        declared = [os.path.join(self.base_dir, rel_path) for rel_path in manifest.get('declared', [])]
+        for path in _expand(declared):
+            if path not in restored:
+                os.remove(path)
+
+        for rel_path, digest in outputs.items():
+            path = os.path.join(self.base_dir, rel_path)
+            if os.path.exists(path) and self.file_hash(path) == digest:
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(self._object_path(digest), path)
+        self._save_memo()
+
+        manifest['last_used'] = time.time()
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return True
+
+    def store(self, stage_name, fingerprint, outputs):
+        """Record a finished stage's outputs; skipped if any output is missing"""
+        files = _expand(outputs)
+        if not files or any(not glob.glob(path) for path in outputs):
+            return False
+
+        entries = {}
+        for path in files:
+            digest = self.file_hash(path)
+            object_path = self._object_path(digest)
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                shutil.copyfile(path, object_path)
+            entries[self._relative(path)] = digest
+        self._save_memo()
+
+        manifest_path = self._manifest_path(stage_name, fingerprint)
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(manifest_path, 'w') as f:
+            json.dump({'stage': stage_name, 'outputs': entries,
+                       'declared': [self._relative(path) for path in outputs],
+                       'last_used': time.time()}, f, indent=2)
+
+        self.evict()
+        return True
+
+    def evict(self):
+        """Drop least recently used manifests until the store fits max_bytes"""
+        manifests = []
+        for path in glob.glob(os.path.join(self.stages_dir, '*', '*.json')):
+            with open(path) as f:
+                manifests.append((json.load(f), path))
+        manifests.sort(key=lambda item: item[0]['last_used'])
+
+        # Reference counts and sizes of the stored objects, measured once
+        references = {}
+        for manifest, _ in manifests:
+            for digest in set(manifest['outputs'].values()):
+                references[digest] = references.get(digest, 0) + 1
+        sizes = {digest: os.path.getsize(self._object_path(digest)) for digest in references
+                 if os.path.exists(self._object_path(digest))}
+        total = sum(sizes.values())
+
+        while manifests and total > self.max_bytes:
+            manifest, path = manifests.pop(0)
+            os.remove(path)
+            for digest in set(manifest['outputs'].values()):
+                references[digest] -= 1
+                if references[digest] == 0:
+                    total -= sizes.get(digest, 0)
+
+        # Remove objects no manifest points to any more
+        keep = {digest for digest, count in references.items() if count > 0}
+        for path in glob.glob(os.path.join(self.objects_dir, '*', '*')):
+            if os.path.basename(path) not in keep:
+                os.remove(path)
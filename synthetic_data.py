@@ -0,0 +1,116 @@
+# synthetic_data.py
+import os
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.transform import from_origin
+from sklearn.ensemble import RandomForestClassifier
+from config import *
+from ndvi_features import INT16_SCALE, build_features, feature_columns, quantize_ndvi
+from raster_io import iter_windows, quantized_profile
+
+# Coarse cell size (pixels) of the nodata hole pattern
+HOLE_CELL = 64
+
+
+def write_synthetic_ndvi(path, size, n_bands=3, nodata_fraction=0.0, seed=42,
+                         pixel_size=0.001, origin=(77.0, 13.5), window_size=1024, dtype='float32'):
+    """Write a size x size NDVI stack with optional nodata holes
+
+    Values are clipped normal noise around 0.4, as in the original dummy
+    raster. Holes are NaN blocks of HOLE_CELL pixels covering about
+    ``nodata_fraction`` of the raster. The raster is written window by
+    window, so even 20k x 20k scenes are generated in bounded memory.
+    ``dtype='int16'`` writes the compact encoding (see quantize_ndvi) from
+    the same float values.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    profile = {
+        'driver': 'GTiff',
+        'dtype': 'float32',
+        'width': size,
+        'height': size,
+        'count': n_bands,
+        'crs': 'EPSG:4326',
+        'transform': from_origin(origin[0], origin[1], pixel_size, pixel_size),
+        'nodata': np.nan,
+        'compress': 'lzw',
+        'tiled': True,
+        'blockxsize': 256,
+        'blockysize': 256
+    }
+
+    if dtype == 'int16':
+        profile = quantized_profile(profile)
+    elif dtype != 'float32':
+        raise ValueError(f"Unsupported NDVI dtype: {dtype}")
+
+    rng = np.random.default_rng(seed)
+    coarse = -(-size // HOLE_CELL)
+    holes = rng.random((coarse, coarse)) < nodata_fraction
+
+    with rasterio.open(path, 'w', **profile) as dst:
+        if dtype == 'int16':
+            dst.scales = [1.0 / INT16_SCALE] * n_bands
+        for window in iter_windows(dst, window_size):
+            shape = (n_bands, window.height, window.width)
+            data = np.clip(rng.normal(loc=0.4, scale=0.2, size=shape), -1.0, 1.0).astype('float32')
+
+            rows = np.arange(window.row_off, window.row_off + window.height) // HOLE_CELL
+            cols = np.arange(window.col_off, window.col_off + window.width) // HOLE_CELL
+            data[:, holes[np.ix_(rows, cols)]] = np.nan
+            dst.write(quantize_ndvi(data) if dtype == 'int16' else data, window=window)
+    return path
+
+
+def write_synthetic_boundaries(raster_path, districts_path, taluks_path,
+                               districts_per_side=2, taluks_per_side=3):
+    """Write grid district and taluk shapefiles covering a raster
+
+    Districts split the raster extent into a districts_per_side grid and
+    each district into a taluks_per_side grid of taluks. The first
+    district is TUMKUR so the dashboard filter finds it. Both layers carry
+    DISTRICT and TALUK attributes.
+    """
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    with rasterio.open(raster_path) as src:
+        bounds = src.bounds
+        crs = src.crs
+
+    def grid(left, bottom, right, top, n):
+        width = (right - left) / n
+        height = (top - bottom) / n
+        return [box(left + i * width, top - (j + 1) * height, left + (i + 1) * width, top - j * height)
+                for j in range(n) for i in range(n)]
+
+    district_rows, taluk_rows = [], []
+    for d, district_geom in enumerate(grid(*bounds, districts_per_side)):
+        district = 'TUMKUR' if d == 0 else f"DISTRICT_{d + 1}"
+        taluk_geoms = grid(*district_geom.bounds, taluks_per_side)
+        for t, taluk_geom in enumerate(taluk_geoms):
+            taluk_rows.append({'DISTRICT': district, 'TALUK': f"{district}_T{t + 1}", 'geometry': taluk_geom})
+        district_rows.append({'DISTRICT': district, 'TALUK': f"{district}_T1", 'geometry': district_geom})
+
+    os.makedirs(os.path.dirname(districts_path), exist_ok=True)
+    os.makedirs(os.path.dirname(taluks_path), exist_ok=True)
+    gpd.GeoDataFrame(district_rows, crs=crs).to_file(districts_path)
+    gpd.GeoDataFrame(taluk_rows, crs=crs).to_file(taluks_path)
+    return districts_path, taluks_path
+
+
+def synthetic_model(n_bands):
+    """Train a forest with the project's hyperparameters on random NDVI and labels"""
+    rng = np.random.default_rng(RANDOM_STATE)
+    features = build_features(rng.uniform(-1, 1, size=(n_bands, 20000)))
+    labels = rng.choice([1, 2, 3, 4], size=features.shape[1])
+    model = RandomForestClassifier(
+        n_estimators=N_ESTIMATORS,
+        random_state=RANDOM_STATE,
+        max_depth=10,
+        min_samples_split=5
+    )
+    # Named columns, as predict_block passes them
+    return model.fit(pd.DataFrame(features.T, columns=feature_columns(n_bands)), labels)
+
@@ -0,0 +1,230 @@
+# tile_pyramid.py
+import hashlib
+import json
+import math
+import os
+from multiprocessing import Pool
+import numpy as np
+import rasterio
+from PIL import Image
+from rasterio.enums import Resampling
+from rasterio.transform import from_bounds
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
+from rasterio.warp import calculate_default_transform, transform_bounds
+from config import *
+from raster_io import pool_size
+
+TILE_SIZE = 256
+MANIFEST_NAME = 'tiles.json'
+# Web Mercator extent
+EARTH_CIRCUMFERENCE = 2 * math.pi * 6378137
+MAX_LATITUDE = 85.0511287798
+
+
+def tile_bounds(z, x, y):
+    """Web Mercator (left, bottom, right, top) of an XYZ tile"""
+    size = EARTH_CIRCUMFERENCE / 2 ** z
+    left = -EARTH_CIRCUMFERENCE / 2 + x * size
+    top = EARTH_CIRCUMFERENCE / 2 - y * size
+    return left, top - size, left + size, top
+
+
+def _lonlat_to_tile(lon, lat, z):
+    n = 2 ** z
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_covering(bounds, z):
+    """XYZ tiles at zoom ``z`` covering lon/lat ``bounds``"""
+    left, bottom, right, top = bounds
+    x_min, y_min = _lonlat_to_tile(left, top, z)
+    x_max, y_max = _lonlat_to_tile(right, bottom, z)
+    return [(z, x, y) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1)]
+
+
+def _palette():
+    """PNG palette mapping each class to its COLOR_MAP colour"""
+    palette = np.zeros((256, 3), dtype=np.uint8)
+    for class_id, color in COLOR_MAP.items():
+        palette[class_id] = [int(color[i:i + 2], 16) for i in (1, 3, 5)]
+    return palette.ravel().tolist()
+
+
+def _style_hash():
+    """Changes whenever the tile colouring changes"""
+    style = {'colors': COLOR_MAP, 'nodata': NODATA_CLASS, 'tile_size': TILE_SIZE}
+    return hashlib.sha256(json.dumps(style, sort_keys=True).encode()).hexdigest()
+
+
+# Per-process state for tile workers
+_worker_path = None
+_worker_tiles_dir = None
+_worker_datasets = {}
+_worker_palette = None
+
+
+def _init_worker(prediction_path, tiles_dir):
+    """Remember the source and output once per worker process"""
+    global _worker_path, _worker_tiles_dir, _worker_datasets, _worker_palette
+    _worker_path = prediction_path
+    _worker_tiles_dir = tiles_dir
+    _worker_datasets = {}
+    _worker_palette = _palette()
+
+
+def _close_worker():
+    for src in _worker_datasets.values():
+        src.close()
+    _worker_datasets.clear()
+
+
+def _source(overview_level):
+    """Dataset for an overview level (None = full resolution), opened once"""
+    src = _worker_datasets.get(overview_level)
+    if src is None:
+        options = {} if overview_level is None else {'overview_level': overview_level}
+        src = _worker_datasets[overview_level] = rasterio.open(_worker_path, **options)
+    return src
+
+
+def _source_window(src, bounds):
+    """Window of ``src`` (padded by a pixel) under Web Mercator ``bounds``, or None"""
+    left, bottom, right, top = transform_bounds('EPSG:3857', src.crs, *bounds)
+    col_a, row_a = ~src.transform * (left, top)
+    col_b, row_b = ~src.transform * (right, bottom)
+    col_off = max(0, math.floor(min(col_a, col_b)) - 1)
+    row_off = max(0, math.floor(min(row_a, row_b)) - 1)
+    col_end = min(src.width, math.ceil(max(col_a, col_b)) + 1)
+    row_end = min(src.height, math.ceil(max(row_a, row_b)) + 1)
+    if col_off >= col_end or row_off >= row_end:
+        return None
+    return Window(col_off, row_off, col_end - col_off, row_end - row_off)
+
+
+def _render_tile(task):
+    """Render one tile from the matching overview if its source changed
+
+    The tile's source window is read and hashed first; unchanged and empty
+    windows are skipped before warping. Returns (key, digest) with digest
+    None for a tile without classified pixels, which is not written.
+    """
+    z, x, y, overview_level, previous = task
+    key = f"{z}/{x}/{y}"
+    src = _source(overview_level)
+    bounds = tile_bounds(z, x, y)
+
+    window = _source_window(src, bounds)
+    if window is None:
+        return key, None
+    source = src.read(1, window=window)
+    if not (source != NODATA_CLASS).any():
+        return key, None
+
+    digest = hashlib.blake2b(source.tobytes(), digest_size=16)
+    digest.update(f"{overview_level}:{window.col_off},{window.row_off},{window.width},{window.height}".encode())
+    digest = digest.hexdigest()
+    path = os.path.join(_worker_tiles_dir, f"{key}.png")
+    if digest == previous and os.path.exists(path):
+        return key, digest
+
+    with WarpedVRT(src, crs='EPSG:3857', transform=from_bounds(*bounds, TILE_SIZE, TILE_SIZE),
+                   width=TILE_SIZE, height=TILE_SIZE, resampling=Resampling.mode,
+                   src_nodata=NODATA_CLASS, nodata=NODATA_CLASS) as vrt:
+        data = vrt.read(1)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    image = Image.frombytes('P', (TILE_SIZE, TILE_SIZE), data.tobytes())
+    image.putpalette(_worker_palette)
+    image.save(path, transparency=NODATA_CLASS)
+    return key, digest
+
+
+def native_zoom(src):
+    """Zoom level whose tile pixels are closest to the raster's resolution"""
+    transform, _, _ = calculate_default_transform(src.crs, 'EPSG:3857', src.width, src.height, *src.bounds)
+    return max(0, math.ceil(math.log2(EARTH_CIRCUMFERENCE / (TILE_SIZE * abs(transform.a)))))
+
+
+def _overview_level(src, z, resolution):
+    """Coarsest overview that is still at least as fine as zoom ``z``"""
+    decimation = EARTH_CIRCUMFERENCE / (TILE_SIZE * 2 ** z) / resolution
+    level = None
+    for i, factor in enumerate(src.overviews(1)):
+        if factor <= decimation:
+            level = i
+    return level
+
+
+def build_tile_pyramid(prediction_path, tiles_dir=TILES_DIR, min_zoom=TILE_MIN_ZOOM,
+                       max_zoom=TILE_MAX_ZOOM, workers=TILE_WORKERS):
+    """Cut the prediction raster into colourised XYZ PNG tiles
+
+    Tiles are Web Mercator ``{z}/{x}/{y}.png`` files coloured with
+    COLOR_MAP, with NODATA_CLASS transparent. Each zoom level is warped
+    from the raster overview closest to its resolution, and tiles without
+    classified pixels are skipped. A manifest stores a hash of every
+    tile's source window, so a rerun only warps and encodes tiles whose
+    source changed and deletes tiles that disappeared. ``max_zoom=None``
+    stops at the raster's native resolution. Tiles are rendered by a
+    process pool (``workers=0`` uses every core). Returns
+    (tiles_dir, min_zoom, max_zoom).
+    """
+
+    print("🧱 Building tile pyramid...")
+
+    with rasterio.open(prediction_path) as src:
+        if max_zoom is None:
+            max_zoom = native_zoom(src)
+        min_zoom = min(min_zoom, max_zoom)
+        lonlat_bounds = transform_bounds(src.crs, 'EPSG:4326', *src.bounds)
+        transform, _, _ = calculate_default_transform(src.crs, 'EPSG:3857', src.width, src.height, *src.bounds)
+        resolution = abs(transform.a)
+        levels = {z: _overview_level(src, z, resolution) for z in range(min_zoom, max_zoom + 1)}
+
+    manifest_path = os.path.join(tiles_dir, MANIFEST_NAME)
+    # Tiles on disk from the last build; their hashes are only reusable with the same style
+    written = {}
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        written = manifest['tiles']
+        if manifest.get('style') == _style_hash():
+            previous = written
+
+    tasks = [(z, x, y, levels[z], previous.get(f"{z}/{x}/{y}"))
+             for z in range(min_zoom, max_zoom + 1)
+             for _, x, y in tiles_covering(lonlat_bounds, z)]
+
+    workers = pool_size(workers, len(tasks))
+
+    os.makedirs(tiles_dir, exist_ok=True)
+    if workers == 1:
+        _init_worker(prediction_path, tiles_dir)
+        try:
+            results = [_render_tile(task) for task in tasks]
+        finally:
+            _close_worker()
+    else:
+        with Pool(workers, initializer=_init_worker, initargs=(prediction_path, tiles_dir)) as pool:
+            results = list(pool.imap_unordered(_render_tile, tasks, chunksize=16))
+
+    tiles = {key: digest for key, digest in results if digest is not None}
+    # Remove tiles that are now empty or outside the pyramid, whatever style drew them
+    for key in written.keys() - tiles.keys():
+        path = os.path.join(tiles_dir, f"{key}.png")
+        if os.path.exists(path):
+            os.remove(path)
+
+    changed = sum(1 for key, digest in tiles.items() if previous.get(key) != digest)
+    with open(manifest_path, 'w') as f:
+        json.dump({'style': _style_hash(), 'min_zoom': min_zoom, 'max_zoom': max_zoom, 'tiles': tiles}, f)
+
+    print(f"💾 Tiles z{min_zoom}-{max_zoom}: {len(tiles):,} tiles ({changed:,} rendered, "
+          f"{len(tasks) - len(tiles):,} empty skipped) in {tiles_dir}")
+
+    return tiles_dir, min_zoom, max_zoom
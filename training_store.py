@@ -0,0 +1,70 @@
+# training_store.py
+import json
+import os
+import numpy as np
+import pandas as pd
+
+MANIFEST_NAME = 'schema.json'
+STORE_VERSION = 1
+
+
+def _column_dtype(name):
+    """Storage dtype for a training-data column"""
+    return np.int16 if name == 'Cluster' else np.float32
+
+
+def write_training_store(df, store_dir):
+    """Write a DataFrame as one raw .npy file per column plus a schema manifest
+
+    Feature columns are stored as float32 and Cluster as int16. The manifest
+    is written last, so a store without one is incomplete.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    manifest_path = os.path.join(store_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    columns = []
+    for name in df.columns:
+        values = np.ascontiguousarray(df[name].to_numpy(dtype=_column_dtype(name)))
+        file_name = f"{name}.npy"
+        np.save(os.path.join(store_dir, file_name), values)
+        columns.append({'name': name, 'dtype': values.dtype.str, 'file': file_name})
+
+    manifest = {'version': STORE_VERSION, 'rows': int(len(df)), 'columns': columns}
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
+
+
+def read_manifest(store_dir):
+    """Return the schema manifest of a training store"""
+    with open(os.path.join(store_dir, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def store_exists(store_dir):
+    """True if store_dir holds a complete training store"""
+    return os.path.exists(os.path.join(store_dir, MANIFEST_NAME))
+
+
+def load_training_store(store_dir, columns=None, mmap=True):
+    """Open a training store as a DataFrame
+
+    Only ``columns`` are opened (all columns if None). With ``mmap=True`` the
+    column files are memory-mapped read-only and wrapped without copying.
+    """
+    manifest = read_manifest(store_dir)
+    available = {c['name']: c for c in manifest['columns']}
+    names = list(available) if columns is None else list(columns)
+
+    missing = [name for name in names if name not in available]
+    if missing:
+        raise KeyError(f"Columns not in training store: {missing}")
+
+    mmap_mode = 'r' if mmap else None
+    data = {
+        name: np.load(os.path.join(store_dir, available[name]['file']), mmap_mode=mmap_mode)
+        for name in names
+    }
+    return pd.DataFrame(data, columns=names, copy=False)
@@ -0,0 +1,133 @@
+# vector_layers.py
+import glob
+import hashlib
+import json
+import math
+import os
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from config import *
+from hashing import file_sha256
+from tile_pyramid import EARTH_CIRCUMFERENCE, TILE_SIZE
+
+# Bump when the layer format changes so cached layers are rebuilt
+LAYER_VERSION = 1
+
+
+def _sources_hash(paths):
+    """Hash files by content; a shapefile includes all of its sidecar files"""
+    digest = hashlib.sha256()
+    for path in paths:
+        parts = sorted(glob.glob(os.path.splitext(path)[0] + '.*')) if path.endswith('.shp') else [path]
+        for part in parts:
+            if os.path.exists(part):
+                digest.update(f"{os.path.basename(part)}:{file_sha256(part)}\n".encode())
+    return digest.hexdigest()
+
+
+def zoom_tolerance(z):
+    """Simplification tolerance in Web Mercator metres at zoom ``z``"""
+    return EARTH_CIRCUMFERENCE / (TILE_SIZE * 2 ** z) * VECTOR_SIMPLIFY_PIXELS
+
+
+def zoom_decimals(z):
+    """Decimal places of a degree that resolve one screen pixel at zoom ``z``"""
+    degrees_per_pixel = 360.0 / (TILE_SIZE * 2 ** z)
+    return max(0, math.ceil(-math.log10(degrees_per_pixel)))
+
+
+def simplify_coverage(geometries, tolerance):
+    """Simplify polygons so neighbours keep sharing identical edges
+
+    Uses shapely.coverage_simplify (shapely >= 2.1 with GEOS >= 3.12) and
+    falls back to per-polygon topology-preserving simplification, which
+    can open slivers between neighbours.
+    """
+    if hasattr(shapely, 'coverage_simplify'):
+        return shapely.coverage_simplify(geometries, tolerance)
+    return shapely.simplify(geometries, tolerance, preserve_topology=True)
+
+
+def _quantize(geometries, decimals):
+    """Round coordinates; shared vertices stay shared because they round alike"""
+    return shapely.transform(geometries, lambda coords: np.round(coords, decimals))
+
+
+def _unit_statistics(stats_path):
+    """Per-region crop areas, total area and dominant crop from a zonal report"""
+    stats = pd.read_csv(stats_path)
+    if stats.empty:
+        return pd.DataFrame()
+    areas = stats.pivot_table(index='Region_Name', columns='Crop_Type', values='Area_ha', aggfunc='sum', fill_value=0)
+    summary = areas.round(1)
+    summary['Total_ha'] = areas.sum(axis=1).round(1)
+    summary['Dominant_Crop'] = areas.idxmax(axis=1)
+    summary.columns = [str(c) for c in summary.columns]
+    return summary
+
+
+def prepare_vector_layers(shapefile, name_column, stats_path=None, layer_name=None,
+                          zooms=VECTOR_ZOOMS, output_dir=VECTOR_DIR):
+    """Write one simplified, quantized GeoJSON layer per zoom level
+
+    Boundaries are simplified in Web Mercator to VECTOR_SIMPLIFY_PIXELS
+    screen pixels at each zoom, keeping shared edges shared, and their
+    lon/lat coordinates are rounded to the precision of a pixel. Each
+    feature carries its crop areas, total area and dominant crop from the
+    zonal report at ``stats_path``, joined on ``name_column``. Layers are
+    cached: they are rebuilt only when the shapefile, the report or the
+    settings change. Returns {zoom: path}.
+    """
+
+    layer_name = layer_name or os.path.splitext(os.path.basename(shapefile))[0]
+    paths = {z: os.path.join(output_dir, f"{layer_name}_z{z}.geojson") for z in zooms}
+
+    sources = [shapefile] + ([stats_path] if stats_path and os.path.exists(stats_path) else [])
+    settings = json.dumps([LAYER_VERSION, name_column, list(zooms), VECTOR_SIMPLIFY_PIXELS])
+    key = hashlib.sha256((_sources_hash(sources) + settings).encode()).hexdigest()
+
+    manifest_path = os.path.join(output_dir, f"{layer_name}.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            if json.load(f).get('key') == key and all(os.path.exists(p) for p in paths.values()):
+                return paths
+
+    units = gpd.read_file(shapefile)
+    if units.crs is None:
+        units = units.set_crs('EPSG:4326')
+    mercator = units.geometry.to_crs('EPSG:3857').values
+
+    properties = pd.DataFrame(units.drop(columns=units.geometry.name))
+    if len(sources) > 1:
+        statistics = _unit_statistics(stats_path)
+        properties = properties.join(statistics, on=name_column)
+    # Plain Python values with JSON nulls for missing statistics
+    properties = json.loads(properties.to_json(orient='records'))
+
+    os.makedirs(output_dir, exist_ok=True)
+    for z, path in paths.items():
+        geometries = simplify_coverage(mercator, zoom_tolerance(z))
+        geometries = gpd.GeoSeries(geometries, crs='EPSG:3857').to_crs('EPSG:4326').values
+        geometries = _quantize(geometries, zoom_decimals(z))
+
+        features = [
+            {'type': 'Feature', 'properties': props, 'geometry': shapely.geometry.mapping(geometry)}
+            for props, geometry in zip(properties, geometries)
+            if geometry is not None and not geometry.is_empty
+        ]
+        with open(path, 'w') as f:
+            json.dump({'type': 'FeatureCollection', 'features': features}, f, separators=(',', ':'))
+
+    with open(manifest_path, 'w') as f:
+        json.dump({'key': key, 'layers': {str(z): os.path.basename(p) for z, p in paths.items()}}, f, indent=2)
+
+    print(f"💾 Vector layers for {layer_name} (zooms {', '.join(map(str, zooms))}) saved in {output_dir}")
+    return paths
+
+
+def layer_for_zoom(paths, zoom):
+    """Path of the coarsest prepared layer that is still detailed enough for ``zoom``"""
+    detailed = [z for z in paths if z >= zoom]
+    return paths[min(detailed) if detailed else max(paths)]